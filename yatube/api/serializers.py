@@ -0,0 +1,99 @@
+"""Rows of the API read with ``values()``.
+
+A field maps to a lookup, so the related names are joined into the
+same query the way ``select_related`` would, and rows are turned into
+dicts without building model instances. ``?fields=`` narrows the
+selected columns, not only the output.
+"""
+from posts.models import Post
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'modified': 'modified',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Lists are cached under scopes comments do not bump, so they leave
+# the comment count to single posts and batches
+LIST_FIELDS = {
+    name: lookup for name, lookup in POST_FIELDS.items()
+    if name != 'comments_count'
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+IMAGES = Post._meta.get_field('image').storage
+
+
+class QueryError(ValueError):
+    """A query parameter the API cannot serve."""
+
+
+class FieldsError(QueryError):
+    """``?fields=`` names a field the resource does not have."""
+
+
+def image_url(name: str):
+    return IMAGES.url(name) if name else None
+
+
+CONVERTERS = {'image': image_url}
+
+
+def fields(requested: str, available: dict) -> list:
+    """Fields listed in ``?fields=``, all of them when it is empty."""
+    if not requested:
+        return list(available)
+    names = list(dict.fromkeys(
+        name.strip() for name in requested.split(',') if name.strip()
+    ))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise FieldsError(
+            f'Unknown fields: {", ".join(unknown)}. '
+            f'Available: {", ".join(available)}.'
+        )
+    return names
+
+
+def ids(requested: str, limit: int) -> list:
+    """Distinct ids listed in ``?ids=``, in the order given."""
+    try:
+        found = list(dict.fromkeys(
+            int(value) for value in (requested or '').split(',')
+            if value.strip()
+        ))
+    except ValueError:
+        raise QueryError('Ids must be integers separated by commas.')
+    if not found:
+        raise QueryError('No ids given.')
+    if len(found) > limit:
+        raise QueryError(f'At most {limit} ids at once.')
+    return found
+
+
+def rows(queryset, names: list, available: dict, prefix: str = ''):
+    """``values()`` of the fields, plus ``pk`` and ``created`` of the
+    queryset's own model that cursors are made of.
+    """
+    lookups = ['pk', 'created'] + [
+        prefix + available[name] for name in names
+    ]
+    return queryset.values(*dict.fromkeys(lookups))
+
+
+def serialize(row: dict, names: list, available: dict,
+              prefix: str = '') -> dict:
+    result = {}
+    for name in names:
+        value = row[prefix + available[name]]
+        converter = CONVERTERS.get(name)
+        result[name] = converter(value) if converter else value
+    return result
@@ -0,0 +1,270 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import generations
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.test_query_plans import FULL_SCAN, TEMP_SORT
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.author = User.objects.create(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(settings.PAGE_COUNTS + 3):
+            cls.post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий'
+        )
+        cls.expected = list(
+            Post.objects.order_by('-created', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def setUp(self) -> None:
+        self.client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def walk(self, client, url):
+        """Ids of all pages following the ``next`` links."""
+        ids = []
+        while url:
+            data = client.get(url).json()
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+        return ids
+
+    def test_feeds(self):
+        """Test every feed pages through all posts with cursors."""
+        for url in (
+            reverse('api:posts'),
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api:profile_posts',
+                    kwargs={'username': self.author.username}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(self.client, url), self.expected)
+
+    def test_follow_feed(self):
+        """Test the follow feed of every engine, only for the viewer."""
+        url = reverse('api:follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        for engine in ('timeline', 'merge', 'query'):
+            with self.subTest(engine=engine), override_settings(
+                FOLLOW_FEED_ENGINE=engine
+            ):
+                cache.clear()
+                self.assertEqual(
+                    self.walk(self.authorized_client, url), self.expected
+                )
+
+    def test_fields(self):
+        """Test ``?fields=`` narrows the output and rejects unknowns."""
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,author'}
+        )
+        first = response.json()['results'][0]
+        self.assertEqual(first, {'id': self.post.pk, 'author': 'Author'})
+        self.assertIn('fields=id%2Cauthor', response.json()['next'])
+        response = self.client.get(reverse('api:posts'), {'fields': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lists_have_no_comment_counts(self):
+        """Test lists, which comments do not invalidate, leave the
+        count to single posts.
+        """
+        url = reverse('api:posts')
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        data = self.client.get(url).json()
+        self.assertNotIn('comments_count', data['results'][0])
+        response = self.client.get(url, {'fields': 'comments_count'})
+        self.assertEqual(response.status_code, 400)
+        data = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(data['comments_count'], 2)
+
+    def test_post_detail(self):
+        """Test a post comes with its comments, missing ones are 404."""
+        data = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertIsNone(data['image'])
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий']
+        )
+        response = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_and_etagged(self):
+        """Test a repeated request is served from the cache, a matching
+        ETag gets a 304 and a new post changes the payload.
+        """
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, response.content)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            304
+        )
+        post = Post.objects.create(text='Новый', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['id'], post.pk)
+
+    def test_unknown_parameters_share_the_cache(self):
+        """Test parameters the API does not read change neither the
+        ETag nor the links, so they can not fill the cache.
+        """
+        url = reverse('api:posts')
+        response = self.client.get(url, {'fields': 'id'})
+        for junk in ('a', 'b'):
+            with self.subTest(junk=junk):
+                other = self.client.get(url, {'fields': 'id', 'junk': junk})
+                self.assertEqual(other['ETag'], response['ETag'])
+                self.assertNotIn('junk', other.json()['next'])
+
+    def test_last_modified_only_for_public_resources(self):
+        """Test the follow feed has no viewer-blind Last-Modified."""
+        self.assertTrue(
+            self.client.get(reverse('api:posts')).has_header('Last-Modified')
+        )
+        response = self.authorized_client.get(reverse('api:follow'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_queries_use_indexes(self):
+        """Test API queries have no full scans or temp sorts."""
+        first = self.client.get(reverse('api:posts')).json()
+        urls = [
+            reverse('api:posts'),
+            first['next'],
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api:profile_posts',
+                    kwargs={'username': self.author.username}),
+            reverse('api:follow'),
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    with self.subTest(url=url, sql=query['sql'], step=step):
+                        self.assertNotRegex(step, FULL_SCAN)
+                        self.assertNotIn(TEMP_SORT, step)
+
+    def test_batch(self):
+        """Test posts come in request order, from the cache once read,
+        with unknown ids listed apart.
+        """
+        ids = self.expected[3:6] + [0] + self.expected[:2]
+        url = reverse('api:posts_batch')
+        query = {'ids': ','.join(map(str, ids)), 'fields': 'id,text'}
+        data = self.client.get(url, query).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [pk for pk in ids if pk]
+        )
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertEqual(data['missing'], [0])
+        query['fields'] = 'id'
+        with self.assertNumQueries(0):
+            response = self.client.get(url, query)
+        self.assertEqual(len(response.json()['results']), len(ids) - 1)
+
+    def test_batch_reads_misses_at_once(self):
+        """Test only posts changed since are read, in one query."""
+        url = reverse('api:posts_batch')
+        query = {'ids': ','.join(map(str, self.expected))}
+        self.client.get(url, query)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый текст'
+        post.save()
+        with self.assertNumQueries(1):
+            data = self.client.get(url, query).json()
+        self.assertEqual(data['results'][0]['text'], 'Изменённый текст')
+
+    def test_batch_follows_renamed_author_and_group(self):
+        """Test cached posts show the new username and group slug."""
+        url = reverse('api:posts_batch')
+        query = {'ids': self.post.pk, 'fields': 'author,group'}
+        self.client.get(url, query)
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'Renamed'
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(
+            self.client.get(url, query).json()['results'],
+            [{'author': 'Renamed', 'group': 'renamed'}]
+        )
+
+    def test_other_user_and_group_edits_keep_cached_posts(self):
+        """Test saves that change no shown field leave posts cached."""
+        scope = f'post:{self.post.pk}'
+        version = generations.version(scope)
+        author = User.objects.get(pk=self.author.pk)
+        author.set_password('new password')
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.description = 'Новое описание'
+        group.save()
+        self.assertEqual(generations.version(scope), version)
+
+    def test_batch_creates_no_counters_for_unknown_ids(self):
+        """Test made-up ids leave no generation counters behind."""
+        self.client.get(reverse('api:posts_batch'), {'ids': '0,123456'})
+        for pk in (0, 123456):
+            with self.subTest(pk=pk):
+                self.assertIsNone(cache.get(
+                    generations.KEY.format(f'post:{pk}')
+                ))
+                self.assertIsNone(cache.get(
+                    generations.TOUCHED_KEY.format(f'post:{pk}')
+                ))
+
+    def test_batch_rejects_bad_ids(self):
+        """Test broken, empty and too long id lists get a 400."""
+        url = reverse('api:posts_batch')
+        for ids in ('1,x', '', ','.join(
+            map(str, range(1, settings.API_BATCH_LIMIT + 2))
+        )):
+            with self.subTest(ids=ids[:20]):
+                response = self.client.get(url, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
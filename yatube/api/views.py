@@ -0,0 +1,279 @@
+import hashlib
+import json
+from functools import partial, wraps
+from urllib.parse import urlencode
+
+from core import generations
+from core.paginator import CursorPaginator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from posts import feeds
+from posts.models import Comment, Post
+from posts.views import group_scopes, post_scopes, profile_scopes
+
+from . import serializers
+
+PAYLOAD_KEY = 'api:{}'
+POST_KEY = 'api:post:{}:{}'
+MISSING_KEY = 'api:missing:{}:{}'
+CONTENT_TYPE = 'application/json'
+# Query parameters the views read; others change neither the payload
+# nor its cache key
+PARAMS = ('cursor', 'fields', 'ids')
+
+
+def error(status: int, message: str) -> JsonResponse:
+    return JsonResponse({'error': message}, status=status)
+
+
+def cached_payload(key: str, view, request: HttpRequest, *args,
+                   **kwargs) -> HttpResponse:
+    """The encoded payload from the cache, or from the view."""
+    content = cache.get(key)
+    if content is None:
+        try:
+            payload = view(request, *args, **kwargs)
+        except serializers.QueryError as exception:
+            return error(400, str(exception))
+        except Http404:
+            return error(404, 'Not found.')
+        content = json.dumps(
+            payload, cls=DjangoJSONEncoder, ensure_ascii=False
+        )
+        cache.set(key, content, settings.FEED_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type=CONTENT_TYPE)
+
+
+def query(request: HttpRequest) -> str:
+    """The known parameters of the request, in a stable order."""
+    return urlencode(sorted(
+        (name, request.GET[name]) for name in PARAMS if name in request.GET
+    ))
+
+
+def api_view(scopes, personal: bool = False):
+    """Serve a JSON payload cached under the generations of ``scopes``.
+
+    The view returns a dict, ``scopes`` and the view may raise
+    ``QueryError`` to answer 400. The ETag is made of the generations,
+    the path and the ``PARAMS`` (and the viewer for ``personal``
+    resources) and is also the cache key of the encoded payload, so a
+    repeated request costs the scope lookups and one cache read, and a
+    revalidation ends in a 304. Public resources may be kept by shared
+    caches and get a ``Last-Modified``; personal ones do not, as the
+    time of their scopes is not the time of the viewer's page. The
+    view finds the scopes in ``request.scopes``.
+    """
+    def decorator(view):
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if personal and not request.user.is_authenticated:
+                return error(401, 'Authentication required.')
+            try:
+                page_scopes = scopes(request, *args, **kwargs)
+            except serializers.QueryError as exception:
+                return error(400, str(exception))
+            if page_scopes is None:
+                return error(404, 'Not found.')
+            request.scopes = page_scopes
+            parts = [generations.version(*page_scopes), request.path,
+                     query(request)]
+            if personal:
+                parts.append(str(request.user.pk))
+            etag = hashlib.md5('|'.join(parts).encode()).hexdigest()
+            response = condition(
+                etag_func=lambda *args, **kwargs: etag,
+                last_modified_func=None if personal else (
+                    lambda *args, **kwargs: generations.touched(*page_scopes)
+                )
+            )(partial(cached_payload, PAYLOAD_KEY.format(etag), view))(
+                request, *args, **kwargs
+            )
+            patch_cache_control(
+                response, private=personal, public=not personal,
+                max_age=0, must_revalidate=True
+            )
+            if personal:
+                patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
+
+
+def link(request: HttpRequest, cursor: str):
+    """Path of the neighbouring page, keeping the other known
+    parameters.
+    """
+    if cursor is None:
+        return None
+    params = {
+        name: request.GET[name] for name in PARAMS if name in request.GET
+    }
+    params['cursor'] = cursor
+    return f'{request.path}?{urlencode(sorted(params.items()))}'
+
+
+def post_page(request: HttpRequest, queryset, prefix: str = '') -> dict:
+    """A cursor page of posts with the fields the client asked for."""
+    available = serializers.LIST_FIELDS
+    names = serializers.fields(request.GET.get('fields'), available)
+    paginator = CursorPaginator(
+        serializers.rows(queryset, names, available, prefix),
+        settings.PAGE_COUNTS
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': [
+            serializers.serialize(row, names, available, prefix)
+            for row in page
+        ],
+        'next': link(request, page.next_cursor),
+        'previous': link(request, page.previous_cursor),
+    }
+
+
+@api_view(lambda request: ['global'])
+def posts(request: HttpRequest) -> dict:
+    """Latest posts of the site."""
+    return post_page(request, Post.objects.all())
+
+
+@api_view(group_scopes)
+def group_posts(request: HttpRequest, slug: str) -> dict:
+    return post_page(request, Post.objects.filter(group__slug=slug))
+
+
+@api_view(profile_scopes)
+def profile_posts(request: HttpRequest, username: str) -> dict:
+    return post_page(
+        request, Post.objects.filter(author__username=username)
+    )
+
+
+def batch_scopes(request: HttpRequest) -> list:
+    """``post:<pk>`` scopes of the requested ids.
+
+    Ids without a generation counter are looked up once per list of
+    ids and ``global`` generation, which every new or deleted post
+    bumps; those of posts that do not exist take ``global`` instead,
+    so made-up ids never create counters.
+    """
+    ids = serializers.ids(request.GET.get('ids'), settings.API_BATCH_LIMIT)
+    scopes = [f'post:{pk}' for pk in ids]
+    cold = [
+        pk for pk, version in zip(
+            ids, generations.versions(*scopes, create=False)
+        )
+        if version is None
+    ]
+    if not cold:
+        return scopes
+    key = MISSING_KEY.format(
+        generations.version('global'),
+        hashlib.md5(','.join(map(str, ids)).encode()).hexdigest()
+    )
+    missing = cache.get(key)
+    if missing is None:
+        missing = set(cold) - set(Post.objects.filter(
+            pk__in=cold
+        ).order_by().values_list('pk', flat=True))
+        cache.set(key, missing, settings.FEED_CACHE_TIMEOUT)
+    return [
+        'global' if pk in missing else scope
+        for pk, scope in zip(ids, scopes)
+    ]
+
+
+def cached_posts(ids: list, scopes: list) -> dict:
+    """Serialized posts by id, ``scopes`` being their ``batch_scopes``.
+
+    Every post is cached on its own under its generation, all of them
+    are read with one multi-get and the misses with one ``id__in``
+    query. Ids of missing posts are left out.
+    """
+    available = serializers.POST_FIELDS
+    keys = {
+        POST_KEY.format(pk, version): pk
+        for pk, version in zip(ids, generations.versions(*scopes))
+    }
+    posts = {keys[key]: post for key, post in cache.get_many(keys).items()}
+    missing = [pk for pk in ids if pk not in posts]
+    if missing:
+        loaded = {
+            row['pk']: serializers.serialize(row, list(available), available)
+            for row in serializers.rows(
+                Post.objects.filter(id__in=missing).order_by(),
+                list(available),
+                available
+            )
+        }
+        # Missing posts are cached too: a post made with such an id
+        # bumps ``global``, their scope
+        missed = {key: loaded.get(pk, {}) for key, pk in keys.items()
+                  if pk not in posts}
+        cache.set_many(missed, settings.FEED_CACHE_TIMEOUT)
+        posts.update(loaded)
+    return {pk: post for pk, post in posts.items() if post}
+
+
+@api_view(batch_scopes)
+def posts_batch(request: HttpRequest) -> dict:
+    """Posts listed in ``?ids=`` in the order given, without comments.
+    Ids of posts that do not exist are returned in ``missing``.
+    """
+    ids = serializers.ids(request.GET.get('ids'), settings.API_BATCH_LIMIT)
+    names = serializers.fields(
+        request.GET.get('fields'), serializers.POST_FIELDS
+    )
+    posts = cached_posts(ids, request.scopes)
+    return {
+        'results': [
+            {name: posts[pk][name] for name in names}
+            for pk in ids if pk in posts
+        ],
+        'missing': [pk for pk in ids if pk not in posts],
+    }
+
+
+@api_view(post_scopes)
+def post_detail(request: HttpRequest, post_id: int) -> dict:
+    """A post with all its comments, newest first."""
+    available = serializers.POST_FIELDS
+    names = serializers.fields(request.GET.get('fields'), available)
+    row = serializers.rows(
+        Post.objects.filter(pk=post_id), names, available
+    ).first()
+    if row is None:
+        raise Http404
+    comment_fields = serializers.COMMENT_FIELDS
+    comments = serializers.rows(
+        Comment.objects.filter(post_id=post_id).order_by('-created'),
+        list(comment_fields),
+        comment_fields
+    )
+    return {
+        **serializers.serialize(row, names, available),
+        'comments': [
+            serializers.serialize(comment, list(comment_fields),
+                                  comment_fields)
+            for comment in comments
+        ],
+    }
+
+
+@api_view(
+    lambda request: [f'follows:{request.user.pk}', 'global'],
+    personal=True
+)
+def follow(request: HttpRequest) -> dict:
+    """Posts of the authors the viewer follows."""
+    queryset, prefix = feeds.follow_rows(
+        request.user, request.GET.get('cursor')
+    )
+    return post_page(request, queryset, prefix)
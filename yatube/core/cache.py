@@ -0,0 +1,252 @@
+"""Cache backend shared by all processes of one host.
+
+Entries live in a SQLite file in WAL mode, so every gunicorn worker
+sees the same cache and an invalidation reaches all of them without
+running a cache server. Integers are stored as they are, other values
+are pickled and compressed with zlib once they grow past
+``COMPRESS_MIN_LENGTH``. Reads skip expired rows. Every ``CULL_EVERY``
+writes a process counts the rows and culls them once the table has
+grown past ``MAX_ENTRIES``, expired and soonest to expire first.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+RAW, PICKLED, COMPRESSED = 0, 1, 2
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'flags INTEGER NOT NULL, expires REAL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+# First release with ON CONFLICT ... DO UPDATE
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise ImproperlyConfigured(
+                f'SQLiteCache needs SQLite '
+                f'{".".join(map(str, MIN_SQLITE_VERSION))} or later, '
+                f'Python is linked against {sqlite3.sqlite_version}.'
+            )
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS') or {}
+        self._compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024)
+        )
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = 0
+        self._local = threading.local()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """Connection of the current thread, opened anew after a fork."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            local.db, local.pid = db, os.getpid()
+        return local.db
+
+    def _encode(self, value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value, RAW
+        data = pickle.dumps(value, self.pickle_protocol)
+        if len(data) >= self._compress_min_length:
+            return zlib.compress(data), COMPRESSED
+        return data, PICKLED
+
+    @staticmethod
+    def _decode(value, flags):
+        if flags == RAW:
+            return value
+        if flags == COMPRESSED:
+            value = zlib.decompress(value)
+        return pickle.loads(value)
+
+    def _rows(self, keys, timeout):
+        expires = self.get_backend_timeout(timeout)
+        for key in keys:
+            yield (key, *self._encode(keys[key]), expires)
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the file lock at once."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _write(self, rows):
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', rows
+            )
+            self._cull(db)
+
+    def _cull(self, db):
+        self._writes += 1
+        if self._writes % self._cull_every:
+            return
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries and self._cull_frequency:
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+        elif count > self._max_entries:
+            db.execute('DELETE FROM cache')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row, = self._rows({key: value}, timeout)
+        with self._transaction() as db:
+            added = db.execute(
+                'INSERT INTO cache VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'flags = excluded.flags, expires = excluded.expires '
+                f'WHERE NOT {ALIVE}',
+                (*row, time.time())
+            ).rowcount
+            self._cull(db)
+        return added > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            f'SELECT value, flags FROM cache WHERE key = ? AND {ALIVE}',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return default
+        return self._decode(*row)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(self._rows({key: value}, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), key, time.time())
+        ).rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Read and write back in one write transaction,
+        so concurrent processes never lose an increment.
+        """
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction() as db:
+            row = db.execute(
+                f'SELECT value, flags FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(*row) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, flags = ? WHERE key = ?',
+                (*self._encode(value), key)
+            )
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        found = {}
+        names = list(keys)
+        # SQLite allows 999 variables per statement in older builds.
+        for start in range(0, len(names), 900):
+            chunk = names[start:start + 900]
+            rows = self._db.execute(
+                'SELECT key, value, flags FROM cache WHERE key IN '
+                f'({", ".join("?" * len(chunk))}) AND {ALIVE}',
+                (*chunk, time.time())
+            )
+            for key, value, flags in rows:
+                found[keys[key]] = self._decode(value, flags)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            keys[key] = value
+        self._write(self._rows(keys, timeout))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?', ((key,) for key in keys)
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        """Connections stay open between requests on purpose."""
@@ -0,0 +1,186 @@
+"""Generation counters for cache invalidation.
+
+Every cached piece of a page is keyed by the generations of the scopes
+it depends on (``global``, ``group:<pk>``, ``author:<pk>``,
+``counters:<pk>``, ``follows:<pk>``, ``post:<pk>``). Writers bump the
+scopes they touch, so entries can live for hours and still never be
+served stale: a bump makes the old keys unreachable. Writers bump
+again once their transaction commits, so pages rendered from the rows
+before the commit do not outlive it. A missing counter
+starts from the current time in microseconds, so an evicted counter
+never goes back to a used value.
+
+Alongside the counter every bump records when the scope last changed,
+which gives the API's public resources a ``Last-Modified`` without
+touching the database.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.middleware.cache import CacheMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import decorator_from_middleware_with_args
+from django.views.decorators.http import condition
+
+KEY = 'generation:{}'
+TOUCHED_KEY = 'generation:touched:{}'
+
+
+def initial() -> int:
+    return int(time.time() * 1000000)
+
+
+def bump(*scopes: str) -> None:
+    for scope in scopes:
+        key = KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, initial(), None):
+                cache.incr(key)
+    cache.set_many(
+        {TOUCHED_KEY.format(scope): time.time() for scope in scopes}, None
+    )
+
+
+def bump_existing(*scopes: str) -> None:
+    """Bump the scopes that have a counter with one multi-get and one
+    write, for bulk invalidation. A missing counter starts from the
+    current time anyway, so it is not created.
+    """
+    keys = {KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    if not found:
+        return
+    now, start = time.time(), initial()
+    cache.set_many({
+        **{key: max(value + 1, start) for key, value in found.items()},
+        **{TOUCHED_KEY.format(keys[key]): now for key in found},
+    }, None)
+
+
+def now_and_on_commit(invalidate) -> None:
+    """Run an invalidation now and, inside a transaction, again once it
+    commits. A reader in between sees the new generations but the old
+    rows; whatever it caches then is dropped by the second run.
+    """
+    invalidate()
+    if connection.in_atomic_block:
+        transaction.on_commit(invalidate)
+
+
+def bump_on_commit(*scopes: str) -> None:
+    """``bump`` for writers: now and after the commit."""
+    now_and_on_commit(lambda: bump(*scopes))
+
+
+def versions(*scopes: str, create: bool = True) -> list:
+    """Current generations of the scopes, one multi-get. Missing
+    counters are started with one ``set_many``, or given as None
+    without ``create``.
+    """
+    keys = [KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: initial() for key in keys if key not in found}
+    if missing and create:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found.get(key) for key in keys]
+
+
+def version(*scopes: str) -> str:
+    """Current generations of the scopes joined into one key part."""
+    return '.'.join(str(value) for value in versions(*scopes))
+
+
+def touched(*scopes: str) -> datetime:
+    """Last time any of the scopes changed.
+
+    A forgotten time is taken as now: the client refetches once
+    and then keeps revalidating against the new value.
+    """
+    keys = [TOUCHED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    now = time.time()
+    missing = {key: now for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return datetime.fromtimestamp(max(found.values()), timezone.utc)
+
+
+class GenerationCacheMiddleware(CacheMiddleware):
+    """``CacheMiddleware`` whose key prefix is the generations of
+    ``scopes``, read once per request into a thread-local.
+    """
+
+    def __init__(self, get_response=None, scopes=(), **kwargs) -> None:
+        self.scopes = scopes
+        self.local = threading.local()
+        super().__init__(get_response, **kwargs)
+
+    @property
+    def key_prefix(self) -> str:
+        return self.local.key_prefix
+
+    @key_prefix.setter
+    def key_prefix(self, value) -> None:
+        pass
+
+    def process_request(self, request):
+        self.local.key_prefix = f'gen{version(*self.scopes)}'
+        return super().process_request(request)
+
+    def process_response(self, request, response):
+        """Pages show the viewer: vary on the session cookie before the
+        key is learnt, not after it as ``SessionMiddleware`` would.
+        """
+        patch_vary_headers(response, ('Cookie',))
+        return super().process_response(request, response)
+
+
+def cache_page(timeout: int, *scopes: str):
+    """``cache_page`` whose key prefix is the generations of ``scopes``."""
+    return decorator_from_middleware_with_args(GenerationCacheMiddleware)(
+        cache_timeout=timeout, scopes=scopes
+    )
+
+
+def conditional(scopes):
+    """Answer conditional GET from the generations of the page.
+
+    ``scopes(request, *args, **kwargs)`` lists the scopes the page
+    depends on using cheap lookups only, or returns None to let the
+    view answer (e.g. with a 404). The ETag also covers the viewer and
+    the full path, so pages rendered for another user or another
+    cursor never match. There is no ``Last-Modified``: a date is the
+    same for every viewer and only exact to the second. Browsers have
+    to revalidate every time, which costs them a 304 at most.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_scopes = scopes(request, *args, **kwargs)
+            if page_scopes is None:
+                return view(request, *args, **kwargs)
+            etag = hashlib.md5('|'.join((
+                version(*page_scopes),
+                str(request.user.pk),
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+                request.get_full_path()
+            )).encode()).hexdigest()
+            response = condition(
+                etag_func=lambda *args, **kwargs: etag
+            )(view)(request, *args, **kwargs)
+            patch_cache_control(
+                response, private=True, max_age=0, must_revalidate=True
+            )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,42 @@
+"""Logging handlers."""
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class BackgroundRotatingFileHandler(QueueHandler):
+    """Rotating file written by a thread of its own, so a request only
+    puts the record on a queue. The thread starts with the first record
+    of every process.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0,
+                 encoding='utf-8'):
+        super().__init__(queue.SimpleQueue())
+        self.target = (filename, maxBytes, backupCount, encoding)
+        self.listener = None
+        self.pid = None
+
+    def start(self) -> None:
+        filename, max_bytes, backup_count, encoding = self.target
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count,
+            encoding=encoding
+        ))
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def emit(self, record) -> None:
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def close(self) -> None:
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        super().close()
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+BACKENDS = {
+    'locmem': lambda location, params: LocMemCache('cachebench', params),
+    'sqlite': SQLiteCache,
+}
+
+
+def work(backend, location, seed, options, results):
+    """Read random pages, render misses, bump a shared counter."""
+    cache = BACKENDS[backend](
+        location, {'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}}
+    )
+    rnd = random.Random(seed)
+    value = 'x' * options['value_size']
+    keys = [f'page:{i}' for i in range(options['keys'])]
+    hits = 0
+    start = time.perf_counter()
+    for i in range(options['ops']):
+        key = rnd.choice(keys)
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+        if i % 10 == 0:
+            hits += len(cache.get_many(rnd.sample(keys, 10)))
+        if i % 50 == 0:
+            try:
+                cache.incr('generation')
+            except ValueError:
+                if not cache.add('generation', 1, None):
+                    cache.incr('generation')
+    elapsed = time.perf_counter() - start
+    results.put((hits, elapsed, cache.get('generation')))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the shared SQLite cache with LocMemCache when several '
+        'worker processes read and write the same keys.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--ops', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=4096)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"workers":>8} {"backend":>8} {"ops/s":>10} '
+            f'{"hit rate":>9} {"counter":>8} {"bumps":>6}'
+        )
+        context = multiprocessing.get_context('fork')
+        for workers in options['workers']:
+            for backend in BACKENDS:
+                with tempfile.TemporaryDirectory() as directory:
+                    location = os.path.join(directory, 'cache.sqlite3')
+                    results = context.Queue()
+                    processes = [
+                        context.Process(
+                            target=work,
+                            args=(backend, location, seed, options, results)
+                        )
+                        for seed in range(workers)
+                    ]
+                    for process in processes:
+                        process.start()
+                    reports = [results.get() for _ in processes]
+                    for process in processes:
+                        process.join()
+                self.report(workers, backend, reports, options)
+
+    def report(self, workers, backend, reports, options):
+        ops = options['ops']
+        reads = ops + len(range(0, ops, 10)) * 10
+        hits = sum(hits for hits, _, _ in reports)
+        elapsed = max(elapsed for _, elapsed, _ in reports)
+        counter = max(counter for _, _, counter in reports)
+        bumps = workers * len(range(0, ops, 50))
+        self.stdout.write(
+            f'{workers:>8} {backend:>8} {workers * ops / elapsed:>10.0f} '
+            f'{hits / (workers * reads):>9.1%} {counter:>8} {bumps:>6}'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile all templates, populate URL resolvers and import heavy '
+        'modules, as wsgi.py does before workers fork. Fails on templates '
+        'that do not compile.'
+    )
+
+    def handle(self, *args, **options):
+        report = warmup(freeze=False, strict=True)
+        for step, (seconds, result) in report.items():
+            self.stdout.write(f'{step:>10}: {result:>5} in {seconds:.3f} s')
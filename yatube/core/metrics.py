@@ -0,0 +1,267 @@
+"""Request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` measures every request: count, latency, SQL
+queries and their time, cache hits and misses and template render
+time, labelled by URL name. Values are summed in process memory and
+added to a SQLite file shared by all workers every
+``METRICS_FLUSH_INTERVAL`` seconds, so the endpoint of any worker
+shows the totals of all of them. Histograms keep cumulative buckets,
+as the exposition format wants them.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+
+PREFIX = 'yatube_'
+METRICS = {
+    'requests_total': ('counter', 'Requests by URL name, method and status.'),
+    'request_duration_seconds': ('histogram', 'Request latency.'),
+    'db_queries_total': ('counter', 'SQL queries run by requests.'),
+    'db_query_seconds_total': ('counter', 'Time spent in SQL queries.'),
+    'cache_hits_total': ('counter', 'Cache keys found.'),
+    'cache_misses_total': ('counter', 'Cache keys not found.'),
+    'template_seconds_total': ('counter', 'Time spent rendering templates.'),
+}
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS metrics ('
+    'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+    'PRIMARY KEY (name, labels)) WITHOUT ROWID'
+)
+MISSING = object()
+BOUND = re.compile(r',?le="([^"]+)"$')
+
+_values = defaultdict(float)
+_lock = threading.Lock()
+_local = threading.local()
+_state = {'flushed': time.monotonic(), 'db': None}
+
+
+class RequestStats:
+    """What one request spent on the database, cache and templates."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """``execute_wrapper`` timing every statement."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+
+def current():
+    """Stats of the request the thread is serving, or None."""
+    return getattr(_local, 'stats', None)
+
+
+def start() -> RequestStats:
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def stop() -> None:
+    _local.stats = None
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"'
+    ).replace('\n', '\\n')
+
+
+def labels(**values) -> str:
+    return ','.join(
+        f'{name}="{escape(value)}"' for name, value in sorted(values.items())
+    )
+
+
+def inc(name: str, label: str, value: float = 1) -> None:
+    with _lock:
+        _values[name, label] += value
+
+
+def observe(name: str, label: str, value: float) -> None:
+    """Add a value to a histogram."""
+    with _lock:
+        for bound in settings.METRICS_BUCKETS:
+            if value <= bound:
+                _values[f'{name}_bucket', f'{label},le="{bound}"'] += 1
+        _values[f'{name}_bucket', f'{label},le="+Inf"'] += 1
+        _values[f'{name}_sum', label] += value
+        _values[f'{name}_count', label] += 1
+
+
+def record(view: str, method: str, status: int, seconds: float,
+           stats: RequestStats) -> None:
+    """Account a finished request, flushing when it is time to."""
+    view_label = labels(view=view)
+    inc('requests_total', labels(view=view, method=method, status=status))
+    observe('request_duration_seconds', view_label, seconds)
+    inc('db_queries_total', view_label, stats.queries)
+    inc('db_query_seconds_total', view_label, stats.query_seconds)
+    inc('cache_hits_total', view_label, stats.cache_hits)
+    inc('cache_misses_total', view_label, stats.cache_misses)
+    inc('template_seconds_total', view_label, stats.template_seconds)
+    if time.monotonic() - _state['flushed'] >= (
+        settings.METRICS_FLUSH_INTERVAL
+    ):
+        flush()
+
+
+def database() -> sqlite3.Connection:
+    """Connection to the shared file, shared by the threads."""
+    if _state['db'] is None:
+        db = sqlite3.connect(
+            settings.METRICS_DATABASE, timeout=5, isolation_level=None,
+            check_same_thread=False
+        )
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(SCHEMA)
+        _state['db'] = db
+    return _state['db']
+
+
+def forked() -> None:
+    """A worker starts empty, the parent flushes its own values."""
+    global _lock
+    _lock = threading.Lock()
+    _values.clear()
+    _state['db'] = None
+
+
+def flush() -> None:
+    """Add the values of this process to the shared file."""
+    with _lock:
+        db = database()
+        rows = [(name, label, value) for (name, label), value in
+                _values.items()]
+        _values.clear()
+        _state['flushed'] = time.monotonic()
+        if not rows:
+            return
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT INTO metrics VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) '
+                'DO UPDATE SET value = value + excluded.value',
+                rows
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+
+def exposition() -> str:
+    """Totals of all processes in the Prometheus text format."""
+    flush()
+    with _lock:
+        rows = database().execute(
+            'SELECT name, labels, value FROM metrics'
+        ).fetchall()
+    series = defaultdict(list)
+    for name, label, value in sorted(rows, key=order):
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                family = name[:-len(suffix)]
+        series[family].append(
+            f'{PREFIX}{name}{{{label}}} {value!r}' if label
+            else f'{PREFIX}{name} {value!r}'
+        )
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        if family not in series:
+            continue
+        lines.append(f'# HELP {PREFIX}{family} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{family} {kind}')
+        lines.extend(series[family])
+    return '\n'.join(lines) + '\n'
+
+
+def order(row) -> tuple:
+    """Sort key putting histogram buckets in the order of bounds."""
+    name, label, _ = row
+    bound = BOUND.search(label)
+    if bound is None:
+        return name, label, 0.0
+    return name, label[:bound.start()], float(bound.group(1))
+
+
+def instrument_cache(cache) -> None:
+    """Count hits and misses of a cache backend instance."""
+    if getattr(cache, 'metrics_instrumented', False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    @wraps(get)
+    def counted_get(key, default=None, version=None):
+        value = get(key, MISSING, version=version)
+        stats = current()
+        if stats is not None:
+            if value is MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is MISSING else value
+
+    @wraps(get_many)
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        stats = current()
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+
+    cache.get, cache.get_many = counted_get, counted_get_many
+    cache.metrics_instrumented = True
+
+
+def instrument_templates() -> None:
+    """Time top-level renders of Django templates; nested renders
+    (``render_to_string`` inside a tag) count as part of the outer one.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'metrics_instrumented', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def timed_render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return render(self, context, request)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - start
+
+    timed_render.metrics_instrumented = True
+    Template.render = timed_render
+
+
+os.register_at_fork(after_in_child=forked)
+atexit.register(lambda: _values and flush())
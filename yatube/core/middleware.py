@@ -0,0 +1,282 @@
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from urllib.parse import quote
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.template.base import Node
+
+from . import metrics, template_profiler
+
+logger = logging.getLogger('core.queries')
+slow_logger = logging.getLogger('core.slow_queries')
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+SKIP_FILES = (os.path.abspath(__file__), os.path.abspath(metrics.__file__))
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a sampled request runs more queries than allowed."""
+
+
+def normalize(sql: str) -> str:
+    """Parameterized SQL with IN-lists of any length folded together."""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def call_site() -> str:
+    """Innermost project frame that led to the query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in filename
+            and filename not in SKIP_FILES
+        ):
+            return '{}:{} in {}'.format(
+                os.path.relpath(filename, settings.BASE_DIR),
+                frame.f_lineno,
+                frame.f_code.co_name
+            )
+        frame = frame.f_back
+    return '<unknown>'
+
+
+def template_site() -> str:
+    """Template and line of the innermost node being rendered, if any."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code is Node.render_annotated.__code__:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            return '{}:{}'.format(
+                origin.template_name if origin else '<unknown>',
+                token.lineno if token else '?'
+            )
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that groups statements by SQL and call site."""
+
+    def __init__(self) -> None:
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements[normalize(sql), call_site()] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def total(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, limit: int) -> list:
+        return [
+            (sql, site, count)
+            for (sql, site), count in self.statements.most_common()
+            if count >= limit
+        ]
+
+
+class QueryInspectorMiddleware:
+    """Watch SQL of a sampled share of requests for N+1 patterns.
+
+    ``QUERY_INSPECTOR_SAMPLE_RATE`` of requests is recorded. A request
+    over ``QUERY_INSPECTOR_BUDGET`` queries or repeating one statement
+    from one place ``QUERY_INSPECTOR_REPEATS`` times is logged, or
+    raises ``QueryBudgetExceeded`` with ``QUERY_INSPECTOR_RAISE``.
+    Unsampled requests cost one ``random()`` call.
+    """
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= settings.QUERY_INSPECTOR_SAMPLE_RATE:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        self.report(request, recorder)
+        return response
+
+    def report(self, request: HttpRequest, recorder: QueryRecorder) -> None:
+        problems = [
+            f'{count} x {sql} at {site}'
+            for sql, site, count in recorder.repeated(
+                settings.QUERY_INSPECTOR_REPEATS
+            )
+        ]
+        if recorder.total > settings.QUERY_INSPECTOR_BUDGET:
+            problems.insert(0, (
+                f'{recorder.total} queries, budget is '
+                f'{settings.QUERY_INSPECTOR_BUDGET}'
+            ))
+        if not problems:
+            return
+        message = '{} {}:\n{}'.format(
+            request.method, request.path, '\n'.join(problems)
+        )
+        if settings.QUERY_INSPECTOR_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class MetricsMiddleware:
+    """Record latency, SQL, cache and template time of every request
+    under its URL name, see ``core.metrics``.
+    """
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        metrics.instrument_templates()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        for alias in settings.CACHES:
+            metrics.instrument_cache(caches[alias])
+        stats = metrics.start()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        match = request.resolver_match
+        metrics.record(
+            match.view_name if match else '<unresolved>',
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            stats
+        )
+        return response
+
+
+class SlowQueryLogger:
+    """``execute_wrapper`` tagging SQL with a sqlcommenter comment and
+    logging statements slower than ``SLOW_QUERY_THRESHOLD`` with the
+    view, template line and code that ran them.
+    """
+
+    def __init__(self) -> None:
+        self.view = None
+        self.comment = ''
+
+    def resolved(self, request: HttpRequest, view_func) -> None:
+        match = request.resolver_match
+        self.view = '{} ({}.{})'.format(
+            match.view_name, view_func.__module__,
+            getattr(view_func, '__qualname__', view_func.__class__.__name__)
+        )
+        if settings.SLOW_QUERY_COMMENTS:
+            tags = {
+                'app_name': match.app_name,
+                'controller': match.view_name,
+                'framework': f'django:{django.get_version()}',
+                'route': match.route,
+            }
+            self.comment = ' /*{}*/'.format(','.join(
+                "{}='{}'".format(key, quote(value, safe='/'))
+                for key, value in sorted(tags.items()) if value
+            ))
+
+    def __call__(self, execute, sql, params, many, context):
+        sent = sql
+        if self.comment:
+            # Parameters are filled in with %, so literal % are doubled
+            sent += self.comment if params is None else (
+                self.comment.replace('%', '%%')
+            )
+        start = time.perf_counter()
+        try:
+            return execute(sent, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= settings.SLOW_QUERY_THRESHOLD:
+                self.log(elapsed, sql + self.comment, params, many)
+
+    def log(self, elapsed, sql, params, many) -> None:
+        params = repr(params)
+        if len(params) > 1000:
+            params = params[:1000] + '...'
+        slow_logger.warning(
+            '%.1f ms in %s, template %s, at %s%s\n%s\nparams: %s',
+            elapsed * 1000,
+            self.view or '<unresolved>',
+            template_site() or '-',
+            call_site(),
+            ' (executemany)' if many else '',
+            sql,
+            params
+        )
+
+
+class SlowQueryMiddleware:
+    """Install ``SlowQueryLogger`` for every request unless
+    ``SLOW_QUERY_THRESHOLD`` is None.
+    """
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if settings.SLOW_QUERY_THRESHOLD is None:
+            return self.get_response(request)
+        request.slow_query_logger = SlowQueryLogger()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request.slow_query_logger)
+                )
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, 'slow_query_logger', None)
+        if recorder is not None:
+            recorder.resolved(request, view_func)
+
+
+class TemplateProfilerMiddleware:
+    """Log render times of templates, tags and filters per request
+    while ``TEMPLATE_PROFILER`` is on, see ``core.template_profiler``.
+    """
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if settings.TEMPLATE_PROFILER:
+            template_profiler.install()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.TEMPLATE_PROFILER:
+            return self.get_response(request)
+        template_profiler.install()
+        profile = template_profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            template_profiler.stop()
+        template_profiler.logger.info(
+            '%s %s\n%s', request.method, request.path, profile.table()
+        )
+        template_profiler.finish(profile)
+        return response
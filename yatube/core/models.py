@@ -10,3 +10,13 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StoredFile(models.Model):
+    """Reference count of a file kept once by its content hash."""
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Количество ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Сохранённый файл'
+        verbose_name_plural = 'Сохранённые файлы'
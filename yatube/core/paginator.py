@@ -0,0 +1,119 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+FIRST = 'f'
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+def encode_cursor(direction: str, created=None, pk=None) -> str:
+    """Pack a direction and a ``(created, pk)`` key into an opaque token."""
+    raw = '|'.join((
+        direction,
+        created.isoformat() if created is not None else '',
+        str(pk) if pk is not None else ''
+    ))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def row_key(row) -> tuple:
+    """``(created, pk)`` of a model instance or a ``values()`` row."""
+    if isinstance(row, dict):
+        return row['created'], row['pk']
+    return row.created, row.pk
+
+
+def decode_cursor(cursor: str):
+    """Unpack a token made by ``encode_cursor``.
+
+    Returns ``(direction, created, pk)`` or None if the token is broken.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, created, pk = raw.split('|')
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction in (FIRST, LAST):
+        return direction, None, None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    try:
+        created = parse_datetime(created)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if created is None:
+        return None
+    return direction, created, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator for querysets of CreatedModel descendants.
+
+    Rows are ordered by ``(-created, -pk)`` and every page is a range
+    read starting next to the key stored in an opaque ``?cursor=``
+    token, so there is no ``COUNT(*)`` and no ``OFFSET``: page N costs
+    the same as page 1. The key is matched as ``created <= X AND
+    (created < X OR pk < Y)`` so the first term is an index range.
+
+    ``page()`` returns a plain ``Page`` that keeps the usual template
+    contract (``has_next``, ``has_previous``, ``has_other_pages``,
+    iteration) and additionally carries ``cursor``, ``next_cursor`` and
+    ``previous_cursor``. A ``values()`` queryset works too if its rows
+    have ``created`` and ``pk``. Page numbers are not known without counting,
+    so one paginator instance describes exactly one page.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int) -> None:
+        super().__init__(object_list.order_by('-created', '-pk'), per_page)
+        self.num_pages = 1
+
+    def page(self, cursor: str = None) -> Page:
+        key = decode_cursor(cursor) if cursor else None
+        direction, created, pk = key or (FIRST, None, None)
+        rows = self.object_list
+        if direction == NEXT:
+            rows = rows.filter(created__lte=created).filter(
+                Q(created__lt=created) | Q(pk__lt=pk)
+            )
+        elif direction == PREVIOUS:
+            rows = rows.filter(created__gte=created).filter(
+                Q(created__gt=created) | Q(pk__gt=pk)
+            ).reverse()
+        elif direction == LAST:
+            rows = rows.reverse()
+        rows = list(rows[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction in (PREVIOUS, LAST):
+            rows.reverse()
+            has_previous, has_next = has_more, direction == PREVIOUS
+        else:
+            has_previous, has_next = direction == NEXT, has_more
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.cursor = encode_cursor(direction, created, pk)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = encode_cursor(NEXT, *row_key(rows[-1]))
+        if rows and has_previous:
+            page.previous_cursor = encode_cursor(PREVIOUS, *row_key(rows[0]))
+        return page
+
+    def get_page(self, cursor: str = None) -> Page:
+        """Unlike ``Paginator.get_page`` a broken cursor
+        falls back to the first page rather than to a number.
+        """
+        return self.page(cursor)
+
+    @property
+    def last_cursor(self) -> str:
+        return encode_cursor(LAST)
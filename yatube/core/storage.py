@@ -0,0 +1,91 @@
+"""Content-addressed file storage.
+
+A file is named by the SHA-256 of its content and sharded by the first
+two byte pairs of the hash (``posts/ab/cd/abcd...jpg``), so no
+directory grows past a few thousand entries. The same content is
+written once; ``StoredFile`` counts the references to it, and the file
+goes away with the last one. Names the storage did not create are not
+counted and never deleted by it.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+# A name the storage would give: .../ab/cd/abcd<sha256>.ext
+HASHED = re.compile(
+    r'(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}\.\w+$'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name: str, content: File) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        """Write new content once and count one more reference to it."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            saved = self._save(name, content)
+            if saved != name:
+                # Another process has just written the same file
+                super().delete(saved)
+        else:
+            # The media collector spares recent files: a file found
+            # orphaned before this save must not go while it commits.
+            os.utime(self.path(name))
+        _, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'references': 1}
+        )
+        if not created:
+            StoredFile.objects.filter(name=name).update(
+                references=F('references') + 1
+            )
+        return name
+
+    def release(self, name: str) -> bool:
+        """Drop one reference. The last one deletes the file after
+        commit; returns whether it was the last.
+        """
+        with transaction.atomic():
+            StoredFile.objects.filter(
+                name=name, references__gt=0
+            ).update(references=F('references') - 1)
+            deleted, _ = StoredFile.objects.filter(
+                name=name, references=0
+            ).delete()
+        if deleted:
+            transaction.on_commit(lambda: self.delete_unreferenced(name))
+        return bool(deleted)
+
+    def delete_unreferenced(self, name: str) -> None:
+        """Delete the file unless it has been referenced again."""
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+    def purge(self, name: str) -> None:
+        """Delete the file and its count, whatever the count says."""
+        StoredFile.objects.filter(name=name).delete()
+        super().delete(name)
+
+    def delete(self, name: str) -> None:
+        self.release(name)
@@ -0,0 +1,184 @@
+"""Opt-in render timing of templates, tags and filters.
+
+With ``TEMPLATE_PROFILER`` on, the template engine is patched once
+per process: every template (includes and extended parents too),
+every tag node and every registered filter is timed. A request gets
+calls, cumulative and self time per entry, logged as a table by
+``TemplateProfilerMiddleware``; every ``TEMPLATE_PROFILER_REPORT_EVERY``
+requests the process logs percentiles of the per-request cumulative
+times. Cumulative time counts only the outermost of nested calls of
+one entry, so a ``for`` inside a ``for`` is not counted twice.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from django.conf import settings
+from django.template import engines
+from django.template.base import Node, Template, TextNode, VariableNode
+
+logger = logging.getLogger('core.template_profiler')
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = defaultdict(
+    lambda: deque(maxlen=settings.TEMPLATE_PROFILER_SAMPLES)
+)
+_state = {'installed': False, 'requests': 0}
+
+
+class Profile:
+    """Timings of one request."""
+
+    def __init__(self) -> None:
+        # key -> [calls, total time, own time]
+        self.entries = defaultdict(lambda: [0, 0.0, 0.0])
+        self.stack = []
+        self.active = defaultdict(int)
+
+    def call(self, key: str, function, *args, **kwargs):
+        self.active[key] += 1
+        frame = [time.perf_counter(), 0.0]
+        self.stack.append(frame)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.stack.pop()
+            self.active[key] -= 1
+            elapsed = time.perf_counter() - frame[0]
+            entry = self.entries[key]
+            entry[0] += 1
+            entry[2] += elapsed - frame[1]
+            if not self.active[key]:
+                entry[1] += elapsed
+            if self.stack:
+                self.stack[-1][1] += elapsed
+
+    def table(self, limit: int = 30) -> str:
+        rows = sorted(
+            self.entries.items(), key=lambda item: item[1][2], reverse=True
+        )
+        lines = [f'{"self, ms":>9} {"total, ms":>10} {"calls":>6}  entry']
+        for key, (calls, total, own) in rows[:limit]:
+            lines.append(
+                f'{own * 1000:>9.2f} {total * 1000:>10.2f} {calls:>6}  {key}'
+            )
+        return '\n'.join(lines)
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def start() -> Profile:
+    _local.profile = Profile()
+    return _local.profile
+
+
+def stop() -> None:
+    _local.profile = None
+
+
+def node_key(node: Node):
+    """``tag <name>`` of a tag node, None for text and variables."""
+    try:
+        return node.profiler_key
+    except AttributeError:
+        pass
+    key = None
+    if not isinstance(node, (TextNode, VariableNode)) and node.token:
+        key = 'tag ' + node.token.split_contents()[0]
+    node.profiler_key = key
+    return key
+
+
+def timed_filter(name: str, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = current()
+        if profile is None:
+            return function(*args, **kwargs)
+        return profile.call(f'filter {name}', function, *args, **kwargs)
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument_filters() -> None:
+    """Time the filters of every library of the Django engines."""
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        libraries = list(engine.template_builtins)
+        libraries += engine.template_libraries.values()
+        for library in libraries:
+            for name, function in library.filters.items():
+                if not getattr(function, 'profiled', False):
+                    library.filters[name] = timed_filter(name, function)
+
+
+def install() -> None:
+    """Patch the engine once. Filters of templates compiled before
+    stay untimed, so this runs when the middleware is created.
+    """
+    with _lock:
+        if _state['installed']:
+            return
+        _state['installed'] = True
+    render_annotated, render = Node.render_annotated, Template._render
+
+    @wraps(render_annotated)
+    def timed_render_annotated(self, context):
+        profile = current()
+        key = profile and node_key(self)
+        if key is None:
+            return render_annotated(self, context)
+        return profile.call(key, render_annotated, self, context)
+
+    @wraps(render)
+    def timed_render(self, context):
+        profile = current()
+        if profile is None:
+            return render(self, context)
+        return profile.call(
+            f'template {self.name or "<string>"}', render, self, context
+        )
+
+    Node.render_annotated = timed_render_annotated
+    Template._render = timed_render
+    instrument_filters()
+
+
+def finish(profile: Profile) -> None:
+    """Keep the request's cumulative times for the percentiles and
+    log them every ``TEMPLATE_PROFILER_REPORT_EVERY`` requests.
+    """
+    with _lock:
+        for key, (_, total, _) in profile.entries.items():
+            _samples[key].append(total)
+        _state['requests'] += 1
+        due = not _state['requests'] % settings.TEMPLATE_PROFILER_REPORT_EVERY
+    if due:
+        logger.info('Templates over the last requests:\n%s', percentiles())
+
+
+def percentiles(limit: int = 30) -> str:
+    """p50, p90 and p99 of per-request cumulative times, slowest p90
+    first.
+    """
+    with _lock:
+        samples = {key: sorted(values) for key, values in _samples.items()}
+    rows = []
+    for key, values in samples.items():
+        rows.append((key, len(values), *(
+            values[min(int(len(values) * q), len(values) - 1)] * 1000
+            for q in (0.5, 0.9, 0.99)
+        )))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    lines = [f'{"p50, ms":>8} {"p90, ms":>8} {"p99, ms":>8} '
+             f'{"requests":>8}  entry']
+    for key, count, p50, p90, p99 in rows[:limit]:
+        lines.append(f'{p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {count:>8}  {key}')
+    return '\n'.join(lines)
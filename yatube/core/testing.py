@@ -0,0 +1,51 @@
+"""Test runs with their own cache and metrics files.
+
+The SQLite cache and the metrics file are shared by every process of
+the site, so tests that clear the cache or flush metrics would touch
+the development data. ``isolated_files`` points both into a temporary
+directory; ``TestRunner`` applies it to ``manage.py test`` and the
+pytest ``conftest`` does the same for pytest runs.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from . import metrics
+
+
+@contextmanager
+def isolated_files():
+    """Cache and metrics in a temporary directory while inside."""
+    with tempfile.TemporaryDirectory(prefix='yatube-tests-') as directory:
+        caches = {
+            **settings.CACHES,
+            'default': {
+                **settings.CACHES['default'],
+                'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            },
+        }
+        with override_settings(
+            CACHES=caches,
+            METRICS_DATABASE=os.path.join(directory, 'metrics.sqlite3')
+        ):
+            metrics.forked()
+            try:
+                yield directory
+            finally:
+                metrics.forked()
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs) -> None:
+        super().setup_test_environment(**kwargs)
+        self.isolated_files = isolated_files()
+        self.isolated_files.__enter__()
+
+    def teardown_test_environment(self, **kwargs) -> None:
+        self.isolated_files.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
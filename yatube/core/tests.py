@@ -0,0 +1,592 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.template import engines
+from django.db import transaction
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core import generations, metrics, template_profiler, warmup
+from core.cache import SQLiteCache
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+from core.middleware import QueryBudgetExceeded, QueryInspectorMiddleware
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(
+    QUERY_INSPECTOR_SAMPLE_RATE=1,
+    QUERY_INSPECTOR_RAISE=True,
+    QUERY_INSPECTOR_BUDGET=15,
+    QUERY_INSPECTOR_REPEATS=3
+)
+class QueryInspectorTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        for i in range(5):
+            author = User.objects.create(username=f'Author_{i}')
+            group = Group.objects.create(title=f'Группа {i}', slug=f'g{i}')
+            cls.post = Post.objects.create(
+                text='Тестовый текст', author=author, group=group
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_views_have_no_repeated_queries(self):
+        """Test post views stay in budget without N+1 queries."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group-list', kwargs={'slug': 'g0'}),
+            reverse('posts:profile', kwargs={'username': 'Author_0'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                self.authorized_client.get(page)
+
+    @override_settings(QUERY_INSPECTOR_BUDGET=1)
+    def test_budget_raises(self):
+        """Test request over the budget raises."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.authorized_client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_INSPECTOR_RAISE=False)
+    def test_repeated_queries_logged_with_call_site(self):
+        """Test N+1 pattern is logged with its call site."""
+        def view(request):
+            for post in Post.objects.all():
+                post.author.username
+            return HttpResponse()
+
+        middleware = QueryInspectorMiddleware(view)
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('5 x SELECT', logs.output[0])
+        self.assertIn('core/tests.py', logs.output[0])
+
+    @override_settings(QUERY_INSPECTOR_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_watched(self):
+        """Test request outside the sample is not inspected."""
+        with override_settings(QUERY_INSPECTOR_BUDGET=0):
+            self.authorized_client.get(reverse('posts:index'))
+
+
+class GenerationsTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_bump_changes_only_its_scope(self):
+        """Test bump moves the version of its own scope only."""
+        before = generations.version('global', 'group:1')
+        generations.bump('group:1')
+        after = generations.version('global', 'group:1')
+        self.assertEqual(before.split('.')[0], after.split('.')[0])
+        self.assertNotEqual(before.split('.')[1], after.split('.')[1])
+        self.assertEqual(after, generations.version('global', 'group:1'))
+
+    def test_bump_existing_creates_no_counters(self):
+        """Test bulk bumps move existing counters and start no others."""
+        before = int(generations.version('group:1'))
+        with mock.patch.object(
+            cache, 'set_many', wraps=cache.set_many
+        ) as set_many:
+            generations.bump_existing('group:1', 'group:2')
+        self.assertEqual(set_many.call_count, 1)
+        self.assertGreater(int(generations.version('group:1')), before)
+        self.assertIsNone(cache.get(generations.KEY.format('group:2')))
+
+    def test_evicted_counter_does_not_repeat(self):
+        """Test lost counter restarts above any value it had."""
+        generations.bump('author:1')
+        before = int(generations.version('author:1'))
+        cache.delete(generations.KEY.format('author:1'))
+        self.assertGreater(int(generations.version('author:1')), before)
+
+    def test_cache_page_builds_middleware_once(self):
+        """Test the cache middleware is made when decorating, and the
+        key prefix still follows the generations.
+        """
+        calls = []
+        with mock.patch.object(
+            generations.GenerationCacheMiddleware, '__init__',
+            autospec=True,
+            side_effect=generations.GenerationCacheMiddleware.__init__
+        ) as init:
+            view = generations.cache_page(60, 'group:1')(
+                lambda request: calls.append(1) or HttpResponse('ok')
+            )
+            request = RequestFactory().get('/cached/')
+            view(request)
+            view(request)
+            generations.bump('group:1')
+            view(request)
+        self.assertEqual(init.call_count, 1)
+        self.assertEqual(len(calls), 2)
+
+    def test_comment_leaves_author_pages(self):
+        """Test a comment bumps its post and the commenter's counters,
+        not the post lists of the commenter.
+        """
+        user = User.objects.create(username='Commenter')
+        post = Post.objects.create(text='Пост', author=user)
+        scopes = (f'author:{user.pk}', f'post:{post.pk}',
+                  f'counters:{user.pk}')
+        before = generations.versions(*scopes)
+        Comment.objects.create(post=post, author=user, text='Комментарий')
+        after = generations.versions(*scopes)
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertNotEqual(before[2], after[2])
+
+
+class CommitBumpTest(TransactionTestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_page_cached_before_commit_is_dropped(self):
+        """Test pages rendered inside the writer's transaction, which
+        other connections would render from the old rows, are not
+        served after the commit.
+        """
+        user = User.objects.create(username='Test_User')
+        with transaction.atomic():
+            post = Post.objects.create(text='Тестовый текст', author=user)
+            Comment.objects.create(post=post, author=user, text='Текст')
+            scopes = ('global', f'post:{post.pk}', f'counters:{user.pk}')
+            inside = generations.versions(*scopes)
+            self.client.get(reverse('posts:index'))
+        for scope, before, after in zip(
+            scopes, inside, generations.versions(*scopes)
+        ):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(after, before)
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group-list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_matching_etag_gets_empty_304(self):
+        """Test repeated request with the ETag gets 304 without body."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_no_viewer_blind_last_modified(self):
+        """Test pages have no Last-Modified, so a date alone never
+        gets a page rendered for another viewer.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertFalse(self.client.get(url).has_header(
+                    'Last-Modified'
+                ))
+                response = self.authorized_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        """Test page rendered for a guest does not match for a user."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        """Test new comment by someone else invalidates the post page."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post,
+            author=User.objects.create(username='Commentator'),
+            text='Комментарий'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_browsers_revalidate(self):
+        """Test responses are never used without revalidation."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('max-age=0', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_missing_objects_still_404(self):
+        """Test validators do not hide unknown pages."""
+        for url in (
+            reverse('posts:group-list', kwargs={'slug': 'unknown'}),
+            reverse('posts:profile', kwargs={'username': 'unknown'}),
+            reverse('posts:post_detail', kwargs={'post_id': 1000})
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(response.has_header('ETag'))
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_get_set_and_expiry(self):
+        """Test values round-trip and disappear after their timeout."""
+        self.cache.set('number', 5)
+        self.cache.set('list', [1, 'два'], timeout=0.05)
+        self.assertEqual(self.cache.get('number'), 5)
+        self.assertEqual(self.cache.get('list'), [1, 'два'])
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('list'))
+        self.assertTrue(self.cache.add('list', 'снова'))
+        self.assertFalse(self.cache.add('list', 'ещё раз'))
+        self.assertEqual(self.cache.get('list'), 'снова')
+
+    def test_large_values_are_compressed(self):
+        """Test long values are stored compressed and read back."""
+        text = 'Тестовый текст ' * 1000
+        self.cache.set('text', text)
+        stored, = self.cache._db.execute(
+            'SELECT LENGTH(value) FROM cache'
+        ).fetchone()
+        self.assertLess(stored, len(text.encode()) / 10)
+        self.assertEqual(self.cache.get('text'), text)
+
+    def test_many(self):
+        """Test bulk operations see each other's keys."""
+        self.cache.set_many({'a': 1, 'b': 'б', 'c': None})
+        self.cache.delete_many(['c'])
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'd']), {'a': 1, 'b': 'б'}
+        )
+
+    def test_incr_is_shared_and_atomic(self):
+        """Test increments from several processes are never lost."""
+        self.cache.set('counter', 0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 100))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 400)
+
+    def test_cull(self):
+        """Test table is trimmed to the limit, soonest to expire first."""
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_EVERY': 1}
+        })
+        cache.set('forever', 1, timeout=None)
+        for i in range(20):
+            cache.set(f'key{i}', i, timeout=100 + i)
+        count, = cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        self.assertLessEqual(count, 10)
+        self.assertEqual(cache.get('forever'), 1)
+        self.assertIsNone(cache.get('key0'))
+
+    def test_old_sqlite_is_refused(self):
+        """Test SQLite without upserts is reported at start."""
+        with mock.patch('sqlite3.sqlite_version_info', (3, 22, 0)):
+            with self.assertRaises(ImproperlyConfigured):
+                SQLiteCache(self.location, {})
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_same_content_is_stored_once(self):
+        """Test equal uploads share one sharded file and count it."""
+        first = self.storage.save('posts/a.JPG', ContentFile(b'image'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'image'))
+        self.assertEqual(first, second)
+        self.assertRegex(
+            first, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
+        )
+        self.assertEqual(StoredFile.objects.get(name=first).references, 2)
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertNotEqual(first, other)
+
+    def test_shared_file_is_touched(self):
+        """Test a save of stored content makes its file recent again."""
+        name = self.storage.save('posts/a.jpg', ContentFile(b'image'))
+        hour_ago = time.time() - 60 * 60
+        os.utime(self.storage.path(name), (hour_ago, hour_ago))
+        self.storage.save('posts/b.jpg', ContentFile(b'image'))
+        self.assertGreater(
+            self.storage.get_modified_time(name).timestamp(), hour_ago + 60
+        )
+
+    def test_last_release_deletes_file(self):
+        """Test file outlives every reference but the last."""
+        name = self.storage.save('posts/a.jpg', ContentFile(b'image'))
+        self.storage.save('posts/b.jpg', ContentFile(b'image'))
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.storage.delete_unreferenced(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_untracked_files_are_kept(self):
+        """Test files saved before the storage are never deleted by it."""
+        self.storage._save('posts/old.jpg', ContentFile(b'image'))
+        self.assertFalse(self.storage.release('posts/old.jpg'))
+        self.assertTrue(self.storage.exists('posts/old.jpg'))
+
+
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def value(self, series):
+        for line in metrics.exposition().splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_requests_are_counted_by_url_name(self):
+        """Test a request adds to its view's counters and histogram."""
+        view = 'view="posts:index"'
+        requests = self.value(
+            f'yatube_requests_total{{method="GET",status="200",{view}}}'
+        )
+        queries = self.value(f'yatube_db_queries_total{{{view}}}')
+        misses = self.value(f'yatube_cache_misses_total{{{view}}}')
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.value(
+                f'yatube_requests_total{{method="GET",status="200",{view}}}'
+            ),
+            requests + 1
+        )
+        self.assertGreater(
+            self.value(f'yatube_db_queries_total{{{view}}}'), queries
+        )
+        self.assertGreater(
+            self.value(f'yatube_cache_misses_total{{{view}}}'), misses
+        )
+        self.assertGreater(
+            self.value(f'yatube_template_seconds_total{{{view}}}'), 0
+        )
+        self.assertGreater(self.value(
+            f'yatube_request_duration_seconds_bucket{{{view},le="+Inf"}}'
+        ), 0)
+
+    def test_buckets_are_cumulative_and_ordered(self):
+        """Test histogram buckets follow the bounds."""
+        label = metrics.labels(view='test')
+        metrics.observe('request_duration_seconds', label, 0.3)
+        bounds = [
+            line.split('le="')[1].split('"')[0]
+            for line in metrics.exposition().splitlines()
+            if line.startswith('yatube_request_duration_seconds_bucket{'
+                               'view="test"')
+        ]
+        self.assertEqual(bounds[-2:], ['10', '+Inf'])
+        self.assertEqual(
+            [float(bound) for bound in bounds], sorted(map(float, bounds))
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_is_for_staff_and_scrapers(self):
+        """Test outsiders get 404 even from localhost, staff and the
+        scraper's token get metrics.
+        """
+        url = reverse('metrics')
+        for headers in (
+            {'REMOTE_ADDR': '127.0.0.1'},
+            {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+        ):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.client.get(url, **headers).status_code, 404
+                )
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertContains(response, '# TYPE yatube_requests_total counter')
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0)
+class SlowQueryLogTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_query_from_template_names_view_and_line(self):
+        """Test a query run by a template variable names its line."""
+        with self.assertLogs('core.slow_queries') as logs:
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        messages = [
+            message for message in logs.output
+            if 'FROM "posts_comment"' in message
+        ]
+        self.assertTrue(messages)
+        message = messages[0]
+        self.assertIn('posts:post_detail (posts.views.post_detail)', message)
+        self.assertIn('template posts/includes/comments.html:16', message)
+        self.assertIn(
+            "/*app_name='posts',controller='posts%3Apost_detail',", message
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60)
+    def test_fast_queries_are_not_logged(self):
+        """Test only statements over the threshold are logged."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.slow_queries'):
+                self.client.get(reverse('posts:index'))
+
+
+@override_settings(TEMPLATE_PROFILER=True, TEMPLATE_PROFILER_REPORT_EVERY=2)
+class TemplateProfilerTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+        template_profiler.install()
+        # Templates compiled earlier hold filters without timing
+        for loader in engines['django'].engine.template_loaders:
+            loader.reset()
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_request_breakdown(self):
+        """Test templates, includes, tags and filters get their rows."""
+        with self.assertLogs('core.template_profiler', 'INFO') as logs:
+            self.client.get(reverse('posts:post_create'))
+        table = logs.output[0]
+        for entry in ('template posts/create_post.html', 'template base.html',
+                      'template includes/header.html', 'tag include',
+                      'tag url', 'filter addclass'):
+            self.assertIn(entry, table)
+
+    @override_settings(TEMPLATE_PROFILER=False)
+    def test_self_time_excludes_children(self):
+        """Test nested entries add up to the parent's total."""
+        profile = template_profiler.start()
+        try:
+            self.client.get(reverse('posts:index'))
+        finally:
+            template_profiler.stop()
+        calls, total, own = profile.entries['template base.html']
+        self.assertEqual(calls, 1)
+        self.assertLess(own, total)
+        self.assertLessEqual(
+            profile.entries['template includes/header.html'][1], total
+        )
+
+    def test_percentiles_are_reported(self):
+        """Test every few requests percentiles are logged."""
+        with self.assertLogs('core.template_profiler', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+        self.assertTrue(any(
+            'p90, ms' in message and 'template base.html' in message
+            for message in logs.output
+        ))
+
+
+class WarmupTest(TestCase):
+
+    def test_templates_are_cached(self):
+        """Test warm-up compiles templates into the cached loader."""
+        report = warmup.warmup(freeze=False)
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIn('posts/index.html', {
+            key.split('-')[0] for key in loader.get_template_cache
+        })
+        self.assertGreater(report['templates'][1], 0)
+        self.assertGreater(report['urls'][1], 1)
+
+    def test_command(self):
+        """Test the command reports every step."""
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        for step in ('templates', 'urls', 'imports'):
+            self.assertIn(step, out.getvalue())
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,19 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics_view(request):
+    """Prometheus metrics for staff and scrapers sending
+    ``Authorization: Bearer <METRICS_TOKEN>``. The client address is
+    not trusted: behind a local proxy every request comes from it.
+    """
+    token = settings.METRICS_TOKEN
+    authorized = token and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    )
+    if not (request.user.is_staff or authorized):
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,94 @@
+"""Work a fresh process would otherwise do on its first requests.
+
+``warmup()`` compiles every template into the cached loader, fills the
+URL resolvers' reverse and namespace tables and imports Pillow plugins
+and sorl's backends. Called from ``wsgi.py`` it runs in the master
+process before workers are forked (``gunicorn --preload``), and then
+freezes the garbage collector so the warmed objects stay shared
+copy-on-write instead of being touched by collections in each worker.
+No database or cache connection is opened: those must not be shared
+across a fork.
+"""
+import gc
+import logging
+import os
+import time
+
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine) -> list:
+    """Names of all files in the template directories of the engine."""
+    names = set()
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            for directory in inner.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        names.add(os.path.relpath(path, directory).replace(
+                            os.sep, '/'
+                        ))
+    return sorted(names)
+
+
+def templates(strict: bool = False) -> int:
+    """Compile every template of the Django engines, return how many.
+    A broken one is logged, or raised when ``strict``.
+    """
+    compiled = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            try:
+                engine.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError):
+                if strict:
+                    raise
+                logger.exception('Template %s does not compile', name)
+            else:
+                compiled += 1
+    return compiled
+
+
+def urls() -> int:
+    """Populate every resolver, return how many there are."""
+    resolvers = [get_resolver()]
+    for resolver in resolvers:
+        resolver.reverse_dict
+        for _, nested in resolver.namespace_dict.values():
+            resolvers.append(nested)
+    return len(resolvers)
+
+
+def imports() -> int:
+    """Import what the first image-bearing page would, return the
+    number of Pillow formats.
+    """
+    from PIL import Image
+    from sorl.thumbnail import default
+
+    from posts import thumbnails  # noqa: F401
+
+    Image.init()
+    default.backend, default.engine, default.storage, default.kvstore
+    return len(Image.ID)
+
+
+def warmup(freeze: bool = True, strict: bool = False) -> dict:
+    """Run every step, return seconds and result per step."""
+    report = {}
+    steps = (lambda: templates(strict), urls, imports)
+    for name, step in zip(('templates', 'urls', 'imports'), steps):
+        start = time.perf_counter()
+        result = step()
+        report[name] = (time.perf_counter() - start, result)
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return report
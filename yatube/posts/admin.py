@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from posts import search
 from posts.models import Comment, Follow, Group, Post
 
 
@@ -18,6 +19,14 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('created',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Search the full-text index instead of LIKE over text."""
+        if not search_term or not search.indexed():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search.matching(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,248 @@
+"""Streaming import and export of posts, comments, groups, follows
+and users as JSON lines.
+
+Every line is one object in the shape of Django's serializers,
+``{"model": "posts.post", "pk": 1, "fields": {...}}``, foreign keys as
+primary keys. Files ending in ``.gz``, ``.bz2`` or ``.xz`` are
+compressed, ``-`` is the standard stream. Export reads every model
+with ``iterator()`` in the order of ``MODELS``, so an import never
+meets a row before the rows it points to. Password hashes and emails
+of users are only exported when asked for.
+
+Import keeps primary keys and timestamps and writes with
+``bulk_create``, which sends no signals: counters, timelines, image
+references and cached pages are brought up to date once at the end.
+Both directions hold at most one transaction worth of rows in memory.
+"""
+import bz2
+import gzip
+import json
+import lzma
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import groupby, islice
+
+from core import generations
+from core.models import StoredFile
+from core.storage import HASHED
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count
+
+from . import counters, feeds
+from .models import Group, Post
+from .templatetags.post_cards import card_key
+
+MODELS = (
+    'auth.user', 'posts.group', 'posts.post', 'posts.comment', 'posts.follow'
+)
+# Fields left out of exports unless asked for
+PRIVATE_FIELDS = {'auth.user': ('password', 'email')}
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def open_stream(path: str, mode: str):
+    """Text stream of the path, compressed by its extension."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    opener = next(
+        (
+            opener for extension, opener in OPENERS.items()
+            if path.endswith(extension)
+        ),
+        open
+    )
+    with opener(path, mode + 't', encoding='utf-8') as stream:
+        yield stream
+
+
+@lru_cache(maxsize=None)
+def concrete_fields(model) -> dict:
+    """Serialized fields of the model by name."""
+    return {
+        field.name: field for field in model._meta.concrete_fields
+        if not field.primary_key
+    }
+
+
+def dump(model, private: bool = False):
+    """JSON lines of every row of the model, by primary key, without
+    ``PRIVATE_FIELDS`` unless ``private``.
+    """
+    label = model._meta.label_lower
+    skipped = () if private else PRIVATE_FIELDS.get(label, ())
+    names = {
+        field.attname: name for name, field in concrete_fields(model).items()
+        if name not in skipped
+    }
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    rows = model._base_manager.order_by('pk').values('pk', *names)
+    for row in rows.iterator():
+        yield encoder.encode({
+            'model': label,
+            'pk': row.pop('pk'),
+            'fields': {names[key]: value for key, value in row.items()}
+        }) + '\n'
+
+
+def export(stream, labels=MODELS, private: bool = False) -> dict:
+    """Write the models to the stream, return rows per model."""
+    written = {}
+    for label in labels:
+        written[label] = 0
+        for line in dump(apps.get_model(label), private):
+            stream.write(line)
+            written[label] += 1
+    return written
+
+
+def build(model, record: dict):
+    """Unsaved instance of a serialized row."""
+    fields = concrete_fields(model)
+    return model(pk=record['pk'], **{
+        fields[name].attname: value
+        for name, value in record['fields'].items()
+    })
+
+
+@contextmanager
+def preserved_timestamps(*models_):
+    """Keep imported ``auto_now`` and ``auto_now_add`` values,
+    which ``bulk_create`` would replace with the current time.
+    """
+    changed = []
+    for model in models_:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(
+                field, 'auto_now_add', False
+            ):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def load(lines, batch_size: int = 1000, transaction_batches: int = 10):
+    """Insert serialized rows in batches of ``batch_size``, committing
+    every ``transaction_batches`` batches; return rows per model.
+    """
+    records = (json.loads(line) for line in lines if line.strip())
+    chunks = (
+        (apps.get_model(label), chunk)
+        for label, group in groupby(records, key=lambda r: r['model'])
+        for chunk in batches(group, batch_size)
+    )
+    loaded = {}
+    models_ = [apps.get_model(label) for label in MODELS]
+    with preserved_timestamps(*models_):
+        for block in batches(chunks, transaction_batches):
+            with transaction.atomic():
+                for model, chunk in block:
+                    model.objects.bulk_create(
+                        [build(model, record) for record in chunk]
+                    )
+                    label = model._meta.label_lower
+                    loaded[label] = loaded.get(label, 0) + len(chunk)
+    return loaded
+
+
+def repair_image_references(batch_size: int = 1000) -> int:
+    """Set reference counts of stored images to the number of posts
+    using them, return the number of files whose count changed.
+    """
+    rows = Post.objects.exclude(image='').order_by().values_list(
+        'image'
+    ).annotate(total=Count('pk'))
+    changed = 0
+    for batch in batches(rows.iterator(), batch_size):
+        totals = {name: total for name, total in batch if HASHED.search(name)}
+        stored = StoredFile.objects.in_bulk(list(totals))
+        StoredFile.objects.bulk_create(
+            [
+                StoredFile(name=name, references=total)
+                for name, total in totals.items() if name not in stored
+            ],
+            ignore_conflicts=True
+        )
+        drifted = []
+        for name, stored_file in stored.items():
+            if stored_file.references != totals[name]:
+                stored_file.references = totals[name]
+                drifted.append(stored_file)
+        StoredFile.objects.bulk_update(drifted, ['references'])
+        changed += len(totals) - len(stored) + len(drifted)
+    return changed
+
+
+def finish(labels) -> None:
+    """Everything the skipped signals would have done, for all rows."""
+    models_ = [apps.get_model(label) for label in labels]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models_):
+            cursor.execute(sql)
+    with transaction.atomic():
+        counters.repair_users()
+        counters.repair_posts()
+    repair_image_references()
+    with transaction.atomic():
+        feeds.rebuild_timelines()
+    invalidate(labels)
+
+
+def stale_scopes(labels):
+    """Generation scopes of the pages an import may have changed.
+    Counters and timelines of every user are repaired, so all users
+    are in; groups and posts when their rows or comments were loaded.
+    """
+    yield 'global'
+    users = get_user_model().objects.values_list('pk', flat=True)
+    for pk in users.iterator():
+        yield from (f'author:{pk}', f'counters:{pk}', f'follows:{pk}')
+    if {'posts.group', 'posts.post'} & set(labels):
+        for pk in Group.objects.values_list('pk', flat=True).iterator():
+            yield f'group:{pk}'
+    if {'posts.post', 'posts.comment'} & set(labels):
+        for pk in Post.objects.values_list('pk', flat=True).iterator():
+            yield f'post:{pk}'
+
+
+def invalidate(labels, batch_size: int = 1000) -> None:
+    """Bump the scopes an import changed that have counters and drop
+    the cards of its posts, which keep their ``modified`` and so their
+    keys; the rest of the cache, thumbnails and sessions among it,
+    stays.
+    """
+    for scopes in batches(stale_scopes(labels), batch_size):
+        generations.bump_existing(*scopes)
+    if {'posts.post', 'posts.comment'} & set(labels):
+        posts = Post.objects.only('pk', 'modified').iterator()
+        for batch in batches(posts, batch_size):
+            cache.delete_many([card_key(post) for post in batch])
+
+
+def report(verb: str, rows: dict, start: float) -> str:
+    """One line summary of moved rows."""
+    total = sum(rows.values())
+    elapsed = time.perf_counter() - start
+    details = ', '.join(f'{label} {count}' for label, count in rows.items())
+    return f'{verb} {total} rows in {elapsed:.1f} s ({details}).'
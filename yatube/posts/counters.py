@@ -0,0 +1,84 @@
+"""Denormalized counters on ``UserCounters`` and ``Post``.
+
+Signals move the counters by deltas inside the writing transaction,
+``repair_counters`` recounts them from scratch to fix any drift.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+POST_COUNTERS = {
+    'comments_count': (Comment, 'post'),
+}
+
+
+def shifted(**deltas) -> dict:
+    return {
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    }
+
+
+def bump_user(user_id: int, **deltas) -> None:
+    UserCounters.objects.filter(user_id=user_id).update(**shifted(**deltas))
+
+
+def bump_post(post_id: int, **deltas) -> None:
+    Post.objects.filter(pk=post_id).update(**shifted(**deltas))
+
+
+def actual(model, field: str) -> Coalesce:
+    """Correlated COUNT(*) of ``model`` rows pointing at the outer row."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def recount(queryset, counters: dict) -> int:
+    """Store real counts where they drifted, return drifted rows count."""
+    rows = queryset.annotate(**{
+        f'actual_{name}': actual(model, field)
+        for name, (model, field) in counters.items()
+    })
+    drifted = []
+    for row in rows.iterator():
+        changed = False
+        for name in counters:
+            value = getattr(row, f'actual_{name}')
+            if getattr(row, name) != value:
+                setattr(row, name, value)
+                changed = True
+        if changed:
+            drifted.append(row)
+    queryset.model.objects.bulk_update(drifted, list(counters))
+    return len(drifted)
+
+
+def repair_users() -> int:
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(user_id=pk)
+            for pk in User.objects.filter(
+                counters__isnull=True
+            ).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True
+    )
+    return recount(UserCounters.objects.all(), USER_COUNTERS)
+
+
+def repair_posts() -> int:
+    return recount(Post.objects.only('comments_count'), POST_COUNTERS)
@@ -0,0 +1,230 @@
+"""Follow feed engines.
+
+``timeline`` (push) reads a per-user table filled on write,
+``merge`` (pull) merges cached lists of the followed authors' recent
+posts and ``query`` is a plain ``author__in`` query. The engine is
+picked by ``settings.FOLLOW_FEED_ENGINE``. Timelines are maintained
+whatever the engine, so switching back to ``timeline`` is safe.
+"""
+import heapq
+from itertools import chain, islice
+
+from core.paginator import (FIRST, NEXT, PREVIOUS, CursorPaginator,
+                            decode_cursor)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db.models import QuerySet
+
+from .models import FeedEntry, Follow, Post, User
+
+RECENT_POSTS_KEY = 'feeds:recent:{}'
+
+
+def fan_out_post(post: Post) -> None:
+    """Put a new post into the timelines of all author's followers."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                created=post.created
+            )
+            for user_id in followers.iterator()
+        ),
+        ignore_conflicts=True
+    )
+
+
+def backfill(user: User, author: User) -> None:
+    """Copy author's posts into a new follower's timeline."""
+    posts = Post.objects.filter(author=author).values_list('pk', 'created')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user.pk,
+                post_id=pk,
+                author_id=author.pk,
+                created=created
+            )
+            for pk, created in posts.iterator()
+        ),
+        ignore_conflicts=True
+    )
+
+
+def rebuild_timelines(batch_size: int = 1000) -> None:
+    """Add every missing timeline entry, batch by batch."""
+    rows = Follow.objects.filter(author__posts__isnull=False).values_list(
+        'user_id', 'author__posts__id', 'author_id', 'author__posts__created'
+    ).order_by()
+    iterator = rows.iterator()
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    created=created
+                )
+                for user_id, post_id, author_id, created in batch
+            ],
+            ignore_conflicts=True
+        )
+
+
+def drop_author(user: User, author: User) -> None:
+    """Remove author's posts from a former follower's timeline."""
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def timeline(user: User) -> QuerySet:
+    """Timeline entries of a user, with their posts joined in."""
+    return FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+
+
+def followed_posts(user: User) -> QuerySet:
+    """Posts of the authors a user follows, straight from the posts table."""
+    return Post.objects.filter(
+        author__in=Follow.objects.filter(user=user).values('author')
+    ).select_related('author', 'group')
+
+
+def load_recent_posts(author_id: int) -> list:
+    """Newest ``(created, pk)`` keys of an author's posts, newest first."""
+    return list(
+        Post.objects.filter(author_id=author_id).order_by(
+            '-created', '-pk'
+        ).values_list('created', 'pk')[:settings.FEED_RECENT_POSTS]
+    )
+
+
+def refresh_recent_posts(author_id: int) -> None:
+    """Drop the cached list and warm it again if the merge engine is on."""
+    key = RECENT_POSTS_KEY.format(author_id)
+    if settings.FOLLOW_FEED_ENGINE != 'merge':
+        cache.delete(key)
+        return
+    cache.set(key, load_recent_posts(author_id), None)
+
+
+def recent_posts(author_ids) -> list:
+    """Cached recent post keys for every author, one multi-get."""
+    keys = {RECENT_POSTS_KEY.format(pk): pk for pk in author_ids}
+    found = cache.get_many(keys)
+    missing = {
+        key: load_recent_posts(pk)
+        for key, pk in keys.items() if key not in found
+    }
+    if missing:
+        cache.set_many(missing, None)
+    found.update(missing)
+    return list(found.values())
+
+
+def merge_window(lists: list, direction: str, key, size: int):
+    """Pick ``size`` keys next to ``key`` from newest-first lists.
+
+    Returns None when a list cut at ``FEED_RECENT_POSTS`` may be
+    hiding older posts that belong to the window.
+    """
+    limit = settings.FEED_RECENT_POSTS
+    truncated = [recent for recent in lists if len(recent) >= limit]
+    if direction in (FIRST, NEXT):
+        older = (
+            (item for item in recent if key is None or item < key)
+            for recent in lists
+        )
+        window = list(islice(heapq.merge(*older, reverse=True), size))
+        if truncated and (
+            len(window) < size
+            or any(recent[-1] > window[-1] for recent in truncated)
+        ):
+            return None
+        return window
+    if direction == PREVIOUS:
+        if any(recent[-1] > key for recent in truncated):
+            return None
+        newer = (
+            (item for item in recent if item > key) for recent in lists
+        )
+        return heapq.nsmallest(size, chain.from_iterable(newer))
+    if truncated:
+        return None
+    return heapq.nsmallest(size, chain.from_iterable(lists))
+
+
+def merged_posts(user: User, cursor: str) -> QuerySet:
+    """Posts of a single feed page found by a k-way merge of
+    the followed authors' cached recent posts.
+    """
+    author_ids = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    direction, created, pk = (
+        decode_cursor(cursor) if cursor else None
+    ) or (FIRST, None, None)
+    key = (created, pk) if created is not None else None
+    window = merge_window(
+        recent_posts(author_ids),
+        direction,
+        key,
+        settings.PAGE_COUNTS + 1
+    )
+    if window is None:
+        return followed_posts(user)
+    return Post.objects.filter(
+        pk__in=[pk for _, pk in window]
+    ).select_related('author', 'group')
+
+
+def timeline_page(user: User, cursor: str) -> Page:
+    paginator = CursorPaginator(timeline(user), settings.PAGE_COUNTS)
+    page = paginator.get_page(cursor)
+    page.object_list = [entry.post for entry in page]
+    return page
+
+
+def merge_page(user: User, cursor: str) -> Page:
+    paginator = CursorPaginator(
+        merged_posts(user, cursor), settings.PAGE_COUNTS
+    )
+    return paginator.get_page(cursor)
+
+
+def query_page(user: User, cursor: str) -> Page:
+    paginator = CursorPaginator(followed_posts(user), settings.PAGE_COUNTS)
+    return paginator.get_page(cursor)
+
+
+def follow_rows(user: User, cursor: str = None) -> tuple:
+    """Queryset the configured engine pages the follow feed from and
+    the lookup prefix of the post in its rows, for ``values()`` readers.
+    """
+    if settings.FOLLOW_FEED_ENGINE == 'timeline':
+        return FeedEntry.objects.filter(user=user), 'post__'
+    if settings.FOLLOW_FEED_ENGINE == 'merge':
+        return merged_posts(user, cursor), ''
+    return followed_posts(user), ''
+
+
+ENGINES = {
+    'timeline': timeline_page,
+    'merge': merge_page,
+    'query': query_page,
+}
+
+
+def follow_page(user: User, cursor: str = None) -> Page:
+    """Page of the follow feed built by the configured engine."""
+    return ENGINES[settings.FOLLOW_FEED_ENGINE](user, cursor)
@@ -1,5 +1,7 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from posts import images
 from posts.models import Comment, Post
 
 
@@ -9,6 +11,13 @@ class PostForm(ModelForm):
         fields = {'text', 'group', 'image'}
     field_order = ['text', 'group', 'image']
 
+    def clean_image(self):
+        """Store new uploads re-encoded and downscaled."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return images.ingest(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,67 @@
+"""Ingestion of uploaded post images.
+
+Uploads are decoded with bounded memory and stored re-encoded: JPEG
+is decoded straight at a reduced scale with ``draft``, other formats
+are refused above ``POST_IMAGE_MAX_DECODE_PIXELS`` before any pixel
+is read. The result is turned upright by its EXIF orientation, fits
+into ``POST_IMAGE_MAX_SIDE`` and carries no metadata, so every later
+thumbnail job opens a small file.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from PIL import Image, ImageOps
+
+# Formats whose extra frames are an animation. MPO photos keep a second
+# JPEG (a preview or the other eye) and are ingested as plain JPEG.
+ANIMATED = ('GIF', 'PNG', 'WEBP')
+
+
+def ingest(upload: UploadedFile) -> UploadedFile:
+    """Re-encoded copy of an uploaded image."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 1024 // 1024}
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Не удалось прочитать изображение')
+    limit = settings.POST_IMAGE_MAX_SIDE
+    pixels = image.width * image.height
+    if getattr(image, 'is_animated', False) and image.format in ANIMATED:
+        # Animations are not re-encoded, only their size is checked
+        if max(image.size) > limit:
+            raise ValidationError('Анимация больше %(limit)spx',
+                                  params={'limit': limit})
+        upload.seek(0)
+        return upload
+    if image.format in ('JPEG', 'MPO'):
+        scale = max(image.size) / limit
+        image.draft('RGB', (image.width / scale, image.height / scale))
+    elif pixels > settings.POST_IMAGE_MAX_DECODE_PIXELS:
+        raise ValidationError('Изображение слишком большое')
+    # Downscale first, so the rotation copies the small image
+    image.thumbnail((limit, limit), reducing_gap=3.0)
+    image = ImageOps.exif_transpose(image)
+    return encode(image, os.path.splitext(upload.name)[0])
+
+
+def encode(image: Image.Image, stem: str) -> UploadedFile:
+    """PNG for images with transparency, JPEG for the rest."""
+    buffer = io.BytesIO()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image.save(buffer, 'PNG', optimize=True)
+        name, content_type = f'{stem}.png', 'image/png'
+    else:
+        image.convert('RGB').save(
+            buffer, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+            optimize=True, progressive=True
+        )
+        name, content_type = f'{stem}.jpg', 'image/jpeg'
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type)
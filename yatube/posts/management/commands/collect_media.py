@@ -0,0 +1,125 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts import thumbnails
+from posts.bulk import batches
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete post images no post refers to, thumbnails sorl does not '
+        'know and key-value entries of missing files, in throttled batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Seconds to sleep after every batch.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Seconds a file must exist before it can be collected, '
+                 'so uploads of open transactions are kept.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.images = Post._meta.get_field('image').storage
+        upload_to = Post._meta.get_field('image').upload_to
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        for label, found, delete in (
+            ('original images', self.originals(upload_to), self.purge),
+            ('key-value entries', self.entries(), self.forget),
+            ('thumbnails', self.thumbnails(), default.storage.delete),
+        ):
+            count, size = 0, 0
+            for batch in batches(found, options['batch_size']):
+                count += len(batch)
+                size += sum(file_size for _, file_size in batch)
+                if not options['dry_run']:
+                    for name, _ in batch:
+                        delete(name)
+                time.sleep(options['pause'])
+            self.stdout.write(
+                f'{verb} {count} {label}, {size / 1024 / 1024:.1f} MB.'
+            )
+
+    def walk(self, storage, directory):
+        """Names and sizes of the files old enough to collect."""
+        root = storage.path(directory)
+        deadline = time.time() - self.options['min_age']
+        for path, _, files in os.walk(root):
+            for file_name in files:
+                stat = os.stat(os.path.join(path, file_name))
+                if stat.st_mtime <= deadline:
+                    name = os.path.relpath(
+                        os.path.join(path, file_name), storage.location
+                    )
+                    yield name.replace(os.sep, '/'), stat.st_size
+
+    def originals(self, directory):
+        for batch in batches(
+            self.walk(self.images, directory), self.options['batch_size']
+        ):
+            referenced = set(Post.objects.filter(
+                image__in=[name for name, _ in batch]
+            ).values_list('image', flat=True))
+            yield from (
+                (name, size) for name, size in batch if name not in referenced
+            )
+
+    def entries(self):
+        """Entries of images no post refers to or of missing thumbnails.
+        Collecting an image entry also drops its thumbnails.
+        """
+        entries = KVStoreModel.objects.filter(
+            key__startswith=add_prefix('', 'image')
+        ).values_list('value', flat=True)
+        for batch in batches(
+            entries.iterator(), self.options['batch_size']
+        ):
+            files = [deserialize_image_file(value) for value in batch]
+            referenced = set(Post.objects.filter(
+                image__in=[image.name for image in files]
+            ).values_list('image', flat=True))
+            for image in files:
+                if image.name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+                    if not image.exists():
+                        yield image.name, 0
+                elif image.name not in referenced:
+                    yield image.name, 0
+
+    def thumbnails(self):
+        """Thumbnail files without an entry in sorl's store."""
+        for batch in batches(
+            self.walk(default.storage, sorl_settings.THUMBNAIL_PREFIX),
+            self.options['batch_size']
+        ):
+            keys = {
+                add_prefix(ImageFile(name, default.storage).key): (name, size)
+                for name, size in batch
+            }
+            known = set(KVStoreModel.objects.filter(
+                key__in=list(keys)
+            ).values_list('key', flat=True))
+            yield from (
+                file for key, file in keys.items() if key not in known
+            )
+
+    def purge(self, name):
+        self.forget(name)
+        self.images.purge(name)
+
+    def forget(self, name):
+        """Drop the entry of an image with its thumbnails."""
+        thumbnails.drop(name)
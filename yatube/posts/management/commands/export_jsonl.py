@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream users, groups, posts, comments and follows into a JSON '
+        'lines file, compressed for .gz, .bz2 and .xz names.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, - for stdout.')
+        parser.add_argument(
+            '--models', nargs='+', choices=bulk.MODELS, default=bulk.MODELS
+        )
+        parser.add_argument(
+            '--private', action='store_true',
+            help='Also export password hashes and emails of users.'
+        )
+
+    def handle(self, *args, **options):
+        labels = [label for label in bulk.MODELS if label in options['models']]
+        start = time.perf_counter()
+        with bulk.open_stream(options['path'], 'w') as stream:
+            written = bulk.export(stream, labels, options['private'])
+        if options['path'] != '-':
+            self.stdout.write(bulk.report('Exported', written, start))
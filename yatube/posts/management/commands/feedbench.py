@@ -0,0 +1,86 @@
+import time
+from statistics import median
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import feeds
+from posts.models import Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare follow feed engines as the number of followed authors '
+        'grows. Works on synthetic rows that are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--follows', type=int, nargs='+', default=[10, 100, 1000]
+        )
+        parser.add_argument('--posts-per-author', type=int, default=20)
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            authors = self.populate(
+                max(options['follows']), options['posts_per_author']
+            )
+            self.stdout.write(
+                f'{"follows":>8} {"engine":>9} {"first, ms":>10} '
+                f'{"page {}, ms".format(options["pages"]):>10}'
+            )
+            for follows in options['follows']:
+                reader = User.objects.create(username=f'feedbench-{follows}')
+                for author in authors[:follows]:
+                    Follow.objects.create(user=reader, author=author)
+                for engine in feeds.ENGINES:
+                    first, deep = self.measure(
+                        reader, engine, options['pages'], options['repeat']
+                    )
+                    self.stdout.write(
+                        f'{follows:>8} {engine:>9} '
+                        f'{first:>10.2f} {deep:>10.2f}'
+                    )
+            cache.delete_many(
+                [feeds.RECENT_POSTS_KEY.format(a.pk) for a in authors]
+            )
+            transaction.set_rollback(True)
+
+    def populate(self, authors_count, posts_per_author):
+        User.objects.bulk_create(
+            User(username=f'feedbench-author-{i}')
+            for i in range(authors_count)
+        )
+        authors = list(
+            User.objects.filter(username__startswith='feedbench-author-')
+        )
+        Post.objects.bulk_create(
+            (
+                Post(text=f'Пост {i}', author=author)
+                for author in authors
+                for i in range(posts_per_author)
+            )
+        )
+        return authors
+
+    def measure(self, reader, engine, pages, repeat):
+        first_runs, deep_runs = [], []
+        with override_settings(FOLLOW_FEED_ENGINE=engine):
+            for _ in range(repeat):
+                cursor = None
+                for number in range(pages):
+                    start = time.perf_counter()
+                    page = feeds.follow_page(reader, cursor)
+                    list(page)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if number == 0:
+                        first_runs.append(elapsed)
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+                deep_runs.append(elapsed)
+        return median(first_runs), median(deep_runs)
@@ -0,0 +1,234 @@
+import io
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from posts import bulk
+from posts.models import Comment, Follow, Group, Post, User
+
+# Pareto shape of the number of follows of one user
+FOLLOWS_SHAPE = 2.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic users, groups, posts, comments '
+        'and a power-law follow graph using bulk inserts. The same seed '
+        'and end date always give the same rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Mean number of authors a user follows.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Zipf exponent of author popularity.'
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Distinct generated images shared by posts.'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Share of posts with an image, if there are images.'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat,
+            help='Date of the newest post, today by default.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--transaction-batches', type=int, default=10)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        end = options['end'] or datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.end = end.replace(tzinfo=timezone.utc)
+        self.span = timedelta(days=options['days'])
+        self.users = self.next_ids(User, options['users'])
+        self.groups = self.next_ids(Group, options['groups'])
+        self.posts = self.next_ids(Post, options['posts'])
+        first_comment = self.next_ids(Comment, 0).start
+        # The lower an author's number, the more popular the author.
+        # Writing activity has the same distribution but a different
+        # order.
+        self.popularity = list(accumulate(
+            1 / rank ** options['alpha']
+            for rank in range(1, len(self.users) + 1)
+        ))
+        self.writers = list(self.users)
+        self.random.shuffle(self.writers)
+        generated = {}
+        steps = (
+            (User, self.generate_users()),
+            (Group, self.generate_groups()),
+            (Post, self.generate_posts(self.generate_images())),
+            (Comment, self.generate_comments(first_comment)),
+            (Follow, self.generate_follows()),
+        )
+        with bulk.preserved_timestamps(User, Post, Comment):
+            for model, rows in steps:
+                generated[model._meta.label_lower] = self.insert(model, rows)
+        bulk.finish(generated)
+        self.stdout.write(bulk.report('Generated', generated, start))
+
+    def next_ids(self, model, count: int) -> range:
+        """Primary keys after the existing rows."""
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        return range(last + 1, last + 1 + count)
+
+    def insert(self, model, rows) -> int:
+        inserted = 0
+        chunks = bulk.batches(rows, self.options['batch_size'])
+        for block in bulk.batches(chunks, self.options['transaction_batches']):
+            with transaction.atomic():
+                for chunk in block:
+                    model.objects.bulk_create(chunk)
+                    inserted += len(chunk)
+        return inserted
+
+    def pool(self, factory, size: int = 1000) -> list:
+        """Faker values generated once and reused at random."""
+        return [factory() for _ in range(size)]
+
+    def author(self, users=None) -> int:
+        """Random user, the first ones of the list more often."""
+        users = users or self.users
+        index = bisect(
+            self.popularity, self.random.random() * self.popularity[-1]
+        )
+        return users[min(index, len(users) - 1)]
+
+    def moment(self, index: int, total: int) -> datetime:
+        """Time of the index-th of total rows spread over the days,
+        growing with the index.
+        """
+        position = (index + self.random.random()) / max(total, 1)
+        return self.end - self.span + self.span * position
+
+    def generate_users(self):
+        first_names = self.pool(self.fake.first_name)
+        last_names = self.pool(self.fake.last_name)
+        for index, pk in enumerate(self.users):
+            yield User(
+                pk=pk,
+                username=f'user{pk}',
+                first_name=self.random.choice(first_names),
+                last_name=self.random.choice(last_names),
+                email=f'user{pk}@example.com',
+                password='!',
+                date_joined=self.moment(index, len(self.users))
+            )
+
+    def generate_groups(self):
+        for pk in self.groups:
+            yield Group(
+                pk=pk,
+                title=self.fake.catch_phrase(),
+                slug=f'group-{pk}',
+                description=self.fake.paragraph()
+            )
+
+    def generate_images(self) -> list:
+        """Names of stored synthetic pictures."""
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for number in range(self.options['images']):
+            image = Image.new('RGB', (1280, 720), self.color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                x, y = self.random.randrange(1280), self.random.randrange(720)
+                size = self.random.randrange(40, 400)
+                draw.ellipse((x, y, x + size, y + size), fill=self.color())
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            names.append(storage.save(
+                f'posts/synthetic-{number}.jpg',
+                SimpleUploadedFile('synthetic.jpg', buffer.getvalue())
+            ))
+        return names
+
+    def color(self) -> tuple:
+        return tuple(self.random.randrange(256) for _ in range(3))
+
+    def generate_posts(self, images: list):
+        texts = self.pool(lambda: self.fake.paragraph(nb_sentences=4))
+        for index, pk in enumerate(self.posts):
+            created = self.moment(index, len(self.posts))
+            group = None
+            if self.groups and self.random.random() < 0.7:
+                group = self.groups[int(
+                    len(self.groups) * self.random.random() ** 2
+                )]
+            image = ''
+            if images and self.random.random() < self.options['image_ratio']:
+                image = self.random.choice(images)
+            yield Post(
+                pk=pk,
+                text=self.random.choice(texts),
+                author_id=self.author(self.writers),
+                group_id=group,
+                image=image,
+                created=created,
+                modified=created
+            )
+
+    def generate_comments(self, first: int):
+        if not self.posts:
+            return
+        texts = self.pool(self.fake.sentence)
+        for index in range(self.options['comments']):
+            # Fresh posts get more comments
+            position = 1 - self.random.random() ** 3
+            posted = self.end - self.span + self.span * position
+            yield Comment(
+                pk=first + index,
+                post_id=self.posts[
+                    min(int(len(self.posts) * position), len(self.posts) - 1)
+                ],
+                author_id=self.author(self.writers),
+                text=self.random.choice(texts),
+                created=posted + (self.end - posted) * self.random.random()
+            )
+
+    def generate_follows(self):
+        if len(self.users) < 2:
+            return
+        scale = self.options['follows'] * (FOLLOWS_SHAPE - 1) / FOLLOWS_SHAPE
+        limit = len(self.users) // 2
+        for user in self.users:
+            count = min(
+                int(scale * self.random.paretovariate(FOLLOWS_SHAPE)), limit
+            )
+            authors = set()
+            while len(authors) < count:
+                author = self.author()
+                if author in authors:
+                    # The tail of the distribution is filled uniformly
+                    author = self.random.choice(self.users)
+                if author != user:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield Follow(user_id=user, author_id=author)
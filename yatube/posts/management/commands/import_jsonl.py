@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a JSON lines file written by export_jsonl with batched '
+        'bulk inserts, then repair counters, timelines and image '
+        'references once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, - for stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--transaction-batches', type=int, default=10,
+            help='Batches committed together.'
+        )
+        parser.add_argument(
+            '--thumbnails', action='store_true',
+            help='Queue thumbnails of all post images afterwards instead '
+                 'of on their first view.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with bulk.open_stream(options['path'], 'r') as stream:
+            loaded = bulk.load(
+                stream, options['batch_size'], options['transaction_batches']
+            )
+        bulk.finish(loaded)
+        if options['thumbnails']:
+            images = Post.objects.exclude(image='').order_by(
+                'image'
+            ).values_list('image', flat=True).distinct()
+            for name in images.iterator():
+                thumbnails.submit(name)
+        self.stdout.write(bulk.report('Imported', loaded, start))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import HASHED
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Move post images saved under upload names into content-addressed '
+        'storage. Old files are left for the media garbage collector.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        moved, missing, names = 0, 0, set()
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'author_id', 'group_id', 'image', 'modified'
+        )
+        for post in posts.iterator():
+            name = post.image.name
+            if HASHED.search(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name) as image:
+                hashed = storage.save(name, image)
+            # A save, not an update: cached cards and pages of the post
+            # go stale with its ``modified`` and generations.
+            post.image = hashed
+            post.save(update_fields=['image', 'modified'])
+            moved += 1
+            names.add(hashed)
+        self.stdout.write(
+            f'Moved {moved} images into {len(names)} files, '
+            f'{missing} missing.'
+        )
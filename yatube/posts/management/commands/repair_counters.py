@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized post, comment and follow counters.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = counters.repair_users()
+            posts = counters.repair_posts()
+        self.stdout.write(
+            f'Fixed counters of {users} users and {posts} posts.'
+        )
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    keep = Follow.objects.order_by().values('user', 'author').annotate(
+        first=models.Min('pk')
+    ).values_list('first', flat=True)
+    Follow.objects.exclude(pk__in=list(keep)).delete()
+    recount_follows(apps)
+
+
+def recount_follows(apps):
+    """Counters of 0012 still count the dropped duplicates."""
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    for field, counter in (('author', 'followers_count'),
+                           ('user', 'following_count')):
+        totals = Follow.objects.filter(
+            **{field: models.OuterRef('user_id')}
+        ).order_by().values(field).annotate(
+            total=models.Count('pk')
+        ).values('total')
+        UserCounters.objects.update(**{counter: Coalesce(
+            models.Subquery(totals), 0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='posts_feede_user_id_de4f5a_idx',
+        ),
+        migrations.RunPython(
+            drop_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together={('user', 'author')},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created'], name='posts_comme_post_id_581ffd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created', '-id'], name='posts_feede_user_id_50599d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created', '-id'], name='posts_post_created_a3cb1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-created', '-id'], name='posts_post_group_i_4f531a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created', '-id'], name='posts_post_author__670917_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# A post is stored under rowid = id * 2 and a comment under id * 2 + 1,
+# so the triggers find their row without scanning the table.
+CREATE = [
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "text, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_search (rowid, text, post_id) "
+    "SELECT id * 2, text, id FROM posts_post",
+    "INSERT INTO posts_search (rowid, text, post_id) "
+    "SELECT id * 2 + 1, text, post_id FROM posts_comment",
+    "CREATE TRIGGER posts_search_post_insert AFTER INSERT ON posts_post "
+    "BEGIN INSERT INTO posts_search (rowid, text, post_id) "
+    "VALUES (new.id * 2, new.text, new.id); END",
+    "CREATE TRIGGER posts_search_post_update AFTER UPDATE OF text "
+    "ON posts_post BEGIN UPDATE posts_search SET text = new.text "
+    "WHERE rowid = new.id * 2; END",
+    "CREATE TRIGGER posts_search_post_delete AFTER DELETE ON posts_post "
+    "BEGIN DELETE FROM posts_search WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER posts_search_comment_insert AFTER INSERT "
+    "ON posts_comment BEGIN INSERT INTO posts_search (rowid, text, post_id) "
+    "VALUES (new.id * 2 + 1, new.text, new.post_id); END",
+    "CREATE TRIGGER posts_search_comment_update AFTER UPDATE OF text "
+    "ON posts_comment BEGIN UPDATE posts_search SET text = new.text "
+    "WHERE rowid = new.id * 2 + 1; END",
+    "CREATE TRIGGER posts_search_comment_delete AFTER DELETE "
+    "ON posts_comment BEGIN DELETE FROM posts_search "
+    "WHERE rowid = old.id * 2 + 1; END",
+]
+DROP = [
+    'DROP TRIGGER posts_search_post_insert',
+    'DROP TRIGGER posts_search_post_update',
+    'DROP TRIGGER posts_search_post_delete',
+    'DROP TRIGGER posts_search_comment_insert',
+    'DROP TRIGGER posts_search_comment_update',
+    'DROP TRIGGER posts_search_comment_delete',
+    'DROP TABLE posts_search',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,119 @@
+"""Full-text search over posts and their comments.
+
+The SQLite FTS5 table ``posts_search`` (migration 0016) holds the text
+of every post and comment and is kept in sync by triggers, so bulk
+inserts and queryset updates are indexed too. A post is ranked by its
+best matching row under bm25, its own text or any of its comments.
+Other databases have no index and fall back to unranked ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+WORD = re.compile(r'\w+')
+
+
+def match_query(text: str):
+    """FTS5 query matching every word of the text as a prefix,
+    or None when there is nothing to search for.
+    """
+    words = WORD.findall(text or '')
+    if words:
+        return ' '.join(f'"{word}"*' for word in words)
+
+
+def indexed() -> bool:
+    """Whether the database has the index, made on SQLite only."""
+    return connection.vendor == 'sqlite'
+
+
+def containing(queryset, text: str):
+    """Posts of the queryset whose text or comments contain every
+    word, newest first.
+    """
+    words = WORD.findall(text or '')
+    if not words:
+        return queryset.none()
+    for word in words:
+        queryset = queryset.filter(
+            Q(text__icontains=word) | Q(comments__text__icontains=word)
+        )
+    return queryset.distinct()
+
+
+class SearchResults:
+    """Ranked matching posts, sliced by ``Paginator`` into
+    LIMIT/OFFSET queries.
+    """
+
+    def __init__(self, text: str, group_id: int = None,
+                 author_id: int = None):
+        self.query = match_query(text)
+        self.fallback = None
+        if not indexed():
+            filters = {'group_id': group_id, 'author_id': author_id}
+            self.fallback = containing(
+                Post.objects.select_related('author', 'group').filter(**{
+                    field: value for field, value in filters.items()
+                    if value is not None
+                }),
+                text
+            )
+        self.where = ['posts_search MATCH %s']
+        self.params = [self.query]
+        if group_id is not None:
+            self.where.append('p.group_id = %s')
+            self.params.append(group_id)
+        if author_id is not None:
+            self.where.append('p.author_id = %s')
+            self.params.append(author_id)
+
+    def _execute(self, select: str, tail: str = '', params=()) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {select} FROM posts_search s '
+                'JOIN posts_post p ON p.id = s.post_id '
+                f'WHERE {" AND ".join(self.where)} {tail}',
+                [*self.params, *params]
+            )
+            return cursor.fetchall()
+
+    def count(self) -> int:
+        if self.fallback is not None:
+            return self.fallback.count()
+        if self.query is None:
+            return 0
+        return self._execute('COUNT(DISTINCT s.post_id)')[0][0]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index: slice) -> list:
+        if self.fallback is not None:
+            return list(self.fallback[index])
+        if self.query is None:
+            return []
+        ids = [row[0] for row in self._execute(
+            's.post_id', 'GROUP BY s.post_id '
+            'ORDER BY MIN(s.rank), s.post_id DESC LIMIT %s OFFSET %s',
+            [index.stop - index.start, index.start]
+        )]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def matching(queryset, text: str):
+    """Posts of the queryset whose text or comments match."""
+    if not indexed():
+        return containing(queryset, text)
+    query = match_query(text)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        'SELECT post_id FROM posts_search WHERE posts_search MATCH %s',
+        [query]
+    ))
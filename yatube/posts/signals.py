@@ -0,0 +1,205 @@
+from core import generations
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feeds, thumbnails
+from .bulk import batches
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .templatetags.post_cards import card_key
+
+
+# Fields of users and groups that cards and API entries of posts show
+CARD_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+    Group: ('slug',),
+}
+
+
+def post_scopes(post: Post) -> list:
+    """Generation scopes of every page that lists or shows the post."""
+    scopes = ['global', f'author:{post.author_id}', f'post:{post.pk}']
+    for group_id in {post.group_id, getattr(post, 'previous_group_id', None)}:
+        if group_id is not None:
+            scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def posts_changed(posts, batch_size: int = 1000) -> None:
+    """Drop the cards and bump the scopes of many posts, in batches,
+    now and after the commit.
+    """
+    posts = posts.only('pk', 'author_id', 'group_id', 'modified')
+
+    def invalidate():
+        for batch in batches(posts.iterator(), batch_size):
+            cache.delete_many([card_key(post) for post in batch])
+            generations.bump(*{
+                scope for post in batch for scope in post_scopes(post)
+            })
+
+    generations.now_and_on_commit(invalidate)
+
+
+def release_image(name: str) -> None:
+    """Drop a reference to a post image, with the thumbnails
+    of the last one.
+    """
+    storage = Post._meta.get_field('image').storage
+    if storage.release(name):
+        thumbnails.forget(name)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance: User, created: bool, **kwargs) -> None:
+    """Start counters of a new user."""
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+def card_fields_changed(instance) -> bool:
+    """Whether a saved user or group changed what the cards of its
+    posts show, as remembered by ``card_fields_saving``.
+    """
+    previous = getattr(instance, 'previous_card_fields', None)
+    return previous is not None and previous != tuple(
+        getattr(instance, name) for name in CARD_FIELDS[type(instance)]
+    )
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def card_fields_saving(sender, instance, update_fields, **kwargs) -> None:
+    """Remember the fields of an edited user or group that the cards of
+    its posts show. Saves of other fields only, like logins, skip it.
+    """
+    fields = CARD_FIELDS[sender]
+    instance.previous_card_fields = None
+    if instance.pk is None or (
+        update_fields and not set(fields) & set(update_fields)
+    ):
+        return
+    instance.previous_card_fields = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance: User, **kwargs) -> None:
+    """Refresh posts of a user whose names changed."""
+    if card_fields_changed(instance):
+        posts_changed(Post.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance: Group, **kwargs) -> None:
+    """Refresh the group's pages, and its posts when its slug changed."""
+    generations.bump_on_commit(f'group:{instance.pk}')
+    if card_fields_changed(instance):
+        posts_changed(Post.objects.filter(group=instance))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance: Post, **kwargs) -> None:
+    """Remember the group an edited post may be leaving, the image it
+    may be replacing and whether a new upload is about to be stored.
+    """
+    instance.uploading_image = bool(instance.image) and not (
+        instance.image._committed
+    )
+    if instance.pk is not None:
+        instance.previous_group_id, instance.previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance: Post, created: bool, **kwargs) -> None:
+    """Invalidate pages listing the post, queue thumbnails of a new
+    image and release a replaced one, count and fan out a new post.
+    An upload of the content the post already had is counted by the
+    storage once more, so that reference is released too.
+    """
+    generations.bump_on_commit(*post_scopes(instance))
+    previous_image = getattr(instance, 'previous_image', None)
+    if instance.image.name != previous_image:
+        thumbnails.pregenerate(instance.image.name)
+        if previous_image:
+            release_image(previous_image)
+    elif previous_image and getattr(instance, 'uploading_image', False):
+        release_image(previous_image)
+    if not created:
+        return
+    counters.bump_user(instance.author_id, posts_count=1)
+    feeds.refresh_recent_posts(instance.author_id)
+    feeds.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance: Post, **kwargs) -> None:
+    """Invalidate pages listing the post, release its image,
+    uncount it and forget it in the recent posts.
+    """
+    generations.bump_on_commit(*post_scopes(instance))
+    if instance.image:
+        release_image(instance.image.name)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    feeds.refresh_recent_posts(instance.author_id)
+
+
+@receiver(thumbnails.thumbnails_ready)
+def thumbnails_created(sender, name: str, **kwargs) -> None:
+    """Replace placeholders of the image in cached pages and cards."""
+    posts_changed(Post.objects.filter(image=name))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance: Comment, created: bool,
+                    **kwargs) -> None:
+    """Count a new comment for its author and post."""
+    if created:
+        generations.bump_on_commit(
+            f'post:{instance.post_id}', f'counters:{instance.author_id}'
+        )
+        counters.bump_user(instance.author_id, comments_count=1)
+        counters.bump_post(instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance: Comment, **kwargs) -> None:
+    """Uncount a deleted comment."""
+    generations.bump_on_commit(
+        f'post:{instance.post_id}', f'counters:{instance.author_id}'
+    )
+    counters.bump_user(instance.author_id, comments_count=-1)
+    counters.bump_post(instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance: Follow, created: bool, **kwargs) -> None:
+    """Count the follow and backfill the new follower's timeline."""
+    if not created:
+        return
+    generations.bump_on_commit(
+        f'follows:{instance.user_id}',
+        f'counters:{instance.user_id}',
+        f'counters:{instance.author_id}'
+    )
+    counters.bump_user(instance.author_id, followers_count=1)
+    counters.bump_user(instance.user_id, following_count=1)
+    feeds.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance: Follow, **kwargs) -> None:
+    """Uncount the follow and clean the former follower's timeline."""
+    generations.bump_on_commit(
+        f'follows:{instance.user_id}',
+        f'counters:{instance.user_id}',
+        f'counters:{instance.author_id}'
+    )
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    feeds.drop_author(instance.user, instance.author)
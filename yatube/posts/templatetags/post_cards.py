@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{}:{}'
+
+
+def card_key(post) -> str:
+    return CARD_KEY.format(post.pk, post.modified.timestamp())
+
+
+@register.simple_tag
+def post_cards(posts) -> list:
+    """Pairs of post and its rendered card.
+
+    Cards do not depend on the viewer and are cached under post id and
+    modification time, all cards of a page are read with one multi-get.
+    Thumbnails of the cards to render are prefetched the same way.
+    """
+    posts = list(posts)
+    keys = {card_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    prefetched = thumbnails.prefetch(
+        post.image.name
+        for key, post in keys.items() if key not in cards and post.image
+    )
+    missing = {
+        key: render_to_string(
+            'posts/includes/post_card.html',
+            {'post': post, 'thumbnails': prefetched}
+        )
+        for key, post in keys.items() if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+    cards.update(missing)
+    return [(post, mark_safe(cards[card_key(post)])) for post in posts]
@@ -0,0 +1,19 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size='card', prefetched=None):
+    """Picture of a post image or None while it is generated.
+
+    Pages pass the map of ``thumbnails.prefetch`` as ``prefetched``
+    to skip the lookup of each image.
+    """
+    if not image:
+        return None
+    if prefetched and image.name in prefetched:
+        return prefetched[image.name]
+    return thumbnails.ready(image.name, size)
@@ -0,0 +1,130 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import generations
+from core.models import StoredFile
+from posts import bulk
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+CREATED = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+IMAGE = 'posts/ab/cd/abcd' + '0' * 60 + '.jpg'
+
+
+class ImportExportTest(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.author = User.objects.create(username='Author')
+        self.reader = User.objects.create(username='Reader')
+        self.group = Group.objects.create(title='Группа', slug='test_slug')
+        self.post = Post.objects.create(
+            text='Тестовый текст', author=self.author, group=self.group,
+            image=IMAGE
+        )
+        Post.objects.filter(pk=self.post.pk).update(created=CREATED)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def round_trip(self, name):
+        path = os.path.join(self.directory, name)
+        call_command('export_jsonl', path, stdout=StringIO())
+        for model in (Follow, Comment, Post, Group, StoredFile):
+            model.objects.all().delete()
+        User.objects.all().delete()
+        call_command(
+            'import_jsonl', path, '--batch-size', '1',
+            '--transaction-batches', '2', stdout=StringIO()
+        )
+        return path
+
+    def test_export_writes_one_object_per_line(self):
+        """Test export lines follow the serializer format in model order."""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        call_command('export_jsonl', path, stdout=StringIO())
+        with open(path, encoding='utf-8') as stream:
+            lines = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [line['model'] for line in lines],
+            ['auth.user', 'auth.user', 'posts.group', 'posts.post',
+             'posts.comment', 'posts.follow']
+        )
+        self.assertEqual(lines[3]['pk'], self.post.pk)
+        self.assertEqual(lines[3]['fields']['author'], self.author.pk)
+        self.assertEqual(lines[3]['fields']['text'], 'Тестовый текст')
+
+    def test_round_trip_keeps_rows_and_timestamps(self):
+        """Test imported rows keep their keys, relations and dates."""
+        self.round_trip('dump.jsonl.gz')
+        post = Post.objects.get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(post.created, CREATED)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments.get().author.username, 'Reader')
+        self.assertTrue(Follow.objects.filter(
+            user__username='Reader', author__username='Author'
+        ).exists())
+
+    def test_import_repairs_derived_data(self):
+        """Test counters, timelines and image references after import."""
+        self.round_trip('dump.jsonl')
+        self.assertEqual(Post.objects.get().comments_count, 1)
+        author = User.objects.get(username='Author')
+        self.assertEqual(author.counters.posts_count, 1)
+        self.assertEqual(author.counters.followers_count, 1)
+        self.assertTrue(FeedEntry.objects.filter(
+            user__username='Reader', post=self.post.pk
+        ).exists())
+        self.assertEqual(StoredFile.objects.get(name=IMAGE).references, 1)
+
+    def test_private_fields_are_opt_in(self):
+        """Test passwords and emails are exported only with --private."""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        for options, expected in (([], False), (['--private'], True)):
+            with self.subTest(options=options):
+                call_command(
+                    'export_jsonl', path, '--models', 'auth.user', *options,
+                    stdout=StringIO()
+                )
+                with open(path, encoding='utf-8') as stream:
+                    fields = json.loads(stream.readline())['fields']
+                self.assertEqual('password' in fields, expected)
+                self.assertEqual('email' in fields, expected)
+
+    def test_finish_bumps_generations_and_keeps_cache(self):
+        """Test import invalidates the pages it changed, not the cache."""
+        scopes = (
+            f'author:{self.author.pk}', f'group:{self.group.pk}',
+            f'post:{self.post.pk}'
+        )
+        versions = [generations.version(scope) for scope in scopes]
+        cache.set('unrelated', 'value')
+        bulk.finish(['posts.group', 'posts.post'])
+        self.assertEqual(cache.get('unrelated'), 'value')
+        for scope, version in zip(scopes, versions):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(generations.version(scope), version)
+
+    def test_compressed_file(self):
+        """Test .gz files are written compressed."""
+        path = os.path.join(self.directory, 'dump.jsonl.gz')
+        call_command('export_jsonl', path, stdout=StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            self.assertEqual(len(stream.readlines()), 6)
@@ -0,0 +1,103 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image(name, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (20, 20), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        user = User.objects.create(username='Test_User')
+        self.kept = Post.objects.create(
+            text='Тестовый текст', author=user, image=image('a.png', 'red')
+        )
+        deleted = Post.objects.create(
+            text='Тестовый текст', author=user, image=image('b.png', 'blue')
+        )
+        for post in (self.kept, deleted):
+            thumbnails.generate(post.image.name)
+        deleted.delete()
+        self.path = lambda *parts: os.path.join(TEMP_MEDIA_ROOT, *parts)
+        os.makedirs(self.path('cache', 'xx'))
+        for name in ('posts/lost.png', 'cache/xx/unknown.jpg'):
+            with open(self.path(name), 'wb') as file:
+                file.write(b'image')
+        hour_ago = time.time() - 60 * 60 - 1
+        for path, _, files in os.walk(TEMP_MEDIA_ROOT):
+            for name in files:
+                os.utime(os.path.join(path, name), (hour_ago, hour_ago))
+        with open(self.path('posts', 'uploading.png'), 'wb') as file:
+            file.write(b'image')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        os.makedirs(TEMP_MEDIA_ROOT)
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), TEMP_MEDIA_ROOT)
+            for path, _, names in os.walk(TEMP_MEDIA_ROOT) for name in names
+        )
+
+    def collect(self, **options):
+        out = io.StringIO()
+        call_command('collect_media', pause=0, stdout=out, **options)
+        return [line.split(',')[0] for line in out.getvalue().splitlines()]
+
+    def test_dry_run_reports_only(self):
+        """Test dry run counts orphans and deletes nothing."""
+        before = self.files()
+        self.assertEqual(self.collect(dry_run=True), [
+            'Would delete 2 original images',
+            'Would delete 1 key-value entries',
+            'Would delete 1 thumbnails',
+        ])
+        self.assertEqual(self.files(), before)
+
+    def test_orphans_are_deleted(self):
+        """Test only files and entries of live posts stay."""
+        self.assertEqual(self.collect(batch_size=1), [
+            'Deleted 2 original images',
+            'Deleted 0 key-value entries',
+            'Deleted 1 thumbnails',
+        ])
+        card = thumbnails.ready(self.kept.image.name).image.name
+        files = self.files()
+        self.assertIn(self.kept.image.name, files)
+        self.assertIn(card, files)
+        self.assertIn('posts/uploading.png', files)
+        self.assertNotIn('posts/lost.png', files)
+        self.assertNotIn('cache/xx/unknown.jpg', files)
+        self.assertEqual(self.collect(dry_run=True), [
+            'Would delete 0 original images',
+            'Would delete 0 key-value entries',
+            'Would delete 0 thumbnails',
+        ])
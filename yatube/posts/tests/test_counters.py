@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, UserCounters
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.author = User.objects.create(username='Author')
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def counters(self, user):
+        return UserCounters.objects.values(
+            'posts_count',
+            'comments_count',
+            'followers_count',
+            'following_count'
+        ).get(user=user)
+
+    def test_views_keep_counters(self):
+        """Test counters follow posts, comments and follows."""
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Пост'}
+        )
+        post = Post.objects.get(text='Пост')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'}
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertEqual(self.counters(self.user), {
+            'posts_count': 1,
+            'comments_count': 1,
+            'followers_count': 0,
+            'following_count': 1,
+        })
+        self.assertEqual(self.counters(self.author)['followers_count'], 1)
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).comments_count, 1
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.authorized_client.get(
+            reverse('posts:post_delete', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(self.counters(self.user), {
+            'posts_count': 0,
+            'comments_count': 0,
+            'followers_count': 0,
+            'following_count': 0,
+        })
+        self.assertEqual(self.counters(self.author)['followers_count'], 0)
+
+    def test_saving_stale_post_keeps_counter(self):
+        """Test saving an edited post does not overwrite comment counts
+        made since it was loaded.
+        """
+        post = Post.objects.create(text='Пост', author=self.user)
+        stale = Post.objects.get(pk=post.pk)
+        post.comments.create(author=self.author, text='Комментарий')
+        stale.text = 'Изменённый пост'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Изменённый пост')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_repair_counters(self):
+        """Test repair command recounts drifted and missing counters."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        UserCounters.objects.filter(user=self.user).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=3)
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('1 users and 1 posts', out.getvalue())
+        self.assertEqual(self.counters(self.author)['posts_count'], 1)
+        self.assertEqual(self.counters(self.user)['posts_count'], 0)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 0)
+
+    def test_profile_reads_counters(self):
+        """Test profile page does not count posts on render."""
+        Post.objects.create(text='Пост', author=self.author)
+        UserCounters.objects.filter(user=self.author).update(posts_count=42)
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertContains(response, 'Всего постов: 42')
@@ -0,0 +1,164 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feeds
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.author = User.objects.create(username='Author')
+        cls.old_post = Post.objects.create(
+            text='Старый пост',
+            author=cls.author
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def follow(self):
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+
+    def timeline(self):
+        return list(
+            FeedEntry.objects.filter(user=self.user).values_list(
+                'post_id', flat=True
+            )
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Test author's existing posts appear after following."""
+        self.follow()
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    def test_new_post_fans_out(self):
+        """Test new post is written to followers' timelines."""
+        self.follow()
+        self.authorized_client.force_login(self.author)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост'}
+        )
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.timeline(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(FOLLOW_FEED_ENGINE='merge')
+    def test_timeline_kept_under_other_engines(self):
+        """Test timelines stay complete while another engine is on."""
+        self.follow()
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.timeline(), [new_post.pk, self.old_post.pk])
+
+    def test_follow_fragment_ignores_other_authors(self):
+        """Test the follow page fragment key moves only with posts
+        of followed authors.
+        """
+        self.follow()
+        url = reverse('posts:follow_index')
+        version = self.authorized_client.get(url).context['feed_version']
+        Post.objects.create(text='Чужой пост', author=self.user)
+        self.assertEqual(
+            self.authorized_client.get(url).context['feed_version'], version
+        )
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertNotEqual(
+            self.authorized_client.get(url).context['feed_version'], version
+        )
+
+    def test_unfollow_cleans_timeline(self):
+        """Test author's posts leave the timeline after unfollowing."""
+        self.follow()
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertEqual(self.timeline(), [])
+
+    def test_delete_post_cleans_timeline(self):
+        """Test deleted post leaves the timeline."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Удалить', author=self.author)
+        self.authorized_client.force_login(self.author)
+        self.authorized_client.get(
+            reverse('posts:post_delete', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    def test_follow_index_reads_timeline(self):
+        """Test follow page is built from the timeline alone."""
+        self.follow()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.old_post.pk]
+        )
+
+
+@override_settings(
+    FOLLOW_FEED_ENGINE='merge', FEED_RECENT_POSTS=5, PAGE_COUNTS=4
+)
+class MergeFeedTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.authors = [
+            User.objects.create(username=f'Author_{i}') for i in range(3)
+        ]
+        for i in range(8):
+            for author in cls.authors[:i % 3 + 1]:
+                Post.objects.create(text=f'Пост {i}', author=author)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def walk(self, engine):
+        with override_settings(FOLLOW_FEED_ENGINE=engine):
+            pages = [feeds.follow_page(self.user)]
+            while pages[-1].has_next():
+                pages.append(
+                    feeds.follow_page(self.user, pages[-1].next_cursor)
+                )
+        return pages
+
+    def test_merge_matches_query(self):
+        """Test merged feed equals the plain query page by page,
+        including pages past the cached recent posts.
+        """
+        merged = self.walk('merge')
+        expected = self.walk('query')
+        self.assertEqual(
+            [[post.pk for post in page] for page in merged],
+            [[post.pk for post in page] for page in expected]
+        )
+        for page in merged[1:]:
+            with self.subTest(cursor=page.cursor):
+                self.assertEqual(
+                    [post.pk for post in feeds.follow_page(
+                        self.user, page.previous_cursor
+                    )],
+                    [post.pk for post in expected[merged.index(page) - 1]]
+                )
+
+    def test_recent_posts_refreshed_on_write(self):
+        """Test new and deleted posts reach the merged feed at once."""
+        feeds.follow_page(self.user)
+        post = Post.objects.create(text='Новый', author=self.authors[2])
+        self.assertEqual(feeds.follow_page(self.user)[0], post)
+        post.delete()
+        self.assertNotIn(post, list(feeds.follow_page(self.user)))
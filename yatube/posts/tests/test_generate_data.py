@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+def generate(seed=1):
+    call_command(
+        'generate_data', '--users', '30', '--groups', '3', '--posts', '200',
+        '--comments', '100', '--follows', '5', '--seed', str(seed),
+        '--end', '2024-01-01', stdout=StringIO()
+    )
+
+
+class GenerateDataTest(TestCase):
+
+    def test_generates_requested_rows(self):
+        """Test rows are created with counters and timelines."""
+        generate()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertGreater(Follow.objects.count(), 0)
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count()
+        )
+        author = Post.objects.first().author
+        self.assertEqual(author.counters.posts_count, author.posts.count())
+
+    def test_same_seed_gives_same_data(self):
+        """Test generation is reproducible and depends on the seed."""
+        def snapshot():
+            rows = list(Post.objects.order_by('pk').values_list(
+                'text', 'author__first_name', 'created'
+            ))
+            Post.objects.all().delete()
+            User.objects.all().delete()
+            return rows
+
+        generate()
+        first = snapshot()
+        generate()
+        self.assertEqual(snapshot(), first)
+        generate(seed=2)
+        self.assertNotEqual(snapshot(), first)
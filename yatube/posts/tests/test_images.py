@@ -0,0 +1,171 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core import generations
+from core.models import StoredFile
+from posts.images import ingest
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def upload(name, size, format_='JPEG', mode='RGB', **params):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format_, **params)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class IngestTest(TestCase):
+
+    @override_settings(POST_IMAGE_MAX_SIDE=500)
+    def test_large_photo_is_downscaled_upright_and_clean(self):
+        """Test photo fits the limit, follows EXIF rotation, loses EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera'
+        image = Image.open(ingest(
+            upload('photo.jpeg', (3000, 2000), exif=exif.tobytes())
+        ))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (333, 500))
+        self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=500)
+    def test_multi_picture_photo_is_ingested_as_jpeg(self):
+        """Test an MPO photo is downscaled, not kept as animation."""
+        buffer = io.BytesIO()
+        frames = [Image.new('RGB', (1000, 800), 'red') for _ in range(2)]
+        frames[0].save(buffer, 'MPO', save_all=True,
+                       append_images=frames[1:])
+        image = Image.open(ingest(
+            SimpleUploadedFile('photo.jpg', buffer.getvalue())
+        ))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (500, 400))
+
+    def test_transparent_image_stays_png(self):
+        """Test transparency survives re-encoding."""
+        stored = ingest(upload('logo.gif', (50, 50), 'PNG', 'RGBA'))
+        self.assertEqual(stored.name, 'logo.png')
+        self.assertEqual(Image.open(stored).mode, 'RGBA')
+
+    @override_settings(POST_IMAGE_MAX_DECODE_PIXELS=100)
+    def test_huge_image_without_draft_is_refused(self):
+        """Test formats without draft decoding are refused by size."""
+        with self.assertRaises(ValidationError):
+            ingest(upload('huge.png', (20, 20), 'PNG'))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_big_file_is_refused(self):
+        """Test files over the byte limit are refused unread."""
+        with self.assertRaises(ValidationError):
+            ingest(upload('big.jpg', (20, 20)))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=100)
+class PostImageFormTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_create_and_edit_store_ingested_image(self):
+        """Test both forms store the re-encoded image."""
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Тестовый текст', 'image': upload('a.png', (400, 200))
+        })
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image.width, post.image.height), (100, 50))
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новый текст', 'image': upload('b.jpg', (50, 400))}
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image.width, post.image.height), (13, 100))
+
+    def test_same_image_is_stored_once(self):
+        """Test posts with equal images share one counted file."""
+        posts = [
+            Post.objects.create(
+                text='Тестовый текст', author=self.user,
+                image=upload('a.jpg', (10, 10))
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        stored = StoredFile.objects.get(name=posts[0].image.name)
+        self.assertEqual(stored.references, 2)
+        posts[0].delete()
+        stored.refresh_from_db()
+        self.assertEqual(stored.references, 1)
+
+    def test_same_upload_on_edit_is_counted_once(self):
+        """Test editing a post with its own image keeps one reference,
+        so deleting the post releases the file.
+        """
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Тестовый текст', 'image': upload('a.png', (40, 20))
+        })
+        post = Post.objects.get()
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новый текст', 'image': upload('b.png', (40, 20))}
+        )
+        post.refresh_from_db()
+        stored = StoredFile.objects.get(name=post.image.name)
+        self.assertEqual(stored.references, 1)
+        post.delete()
+        self.assertFalse(StoredFile.objects.filter(name=stored.name).exists())
+
+    def test_rehash_moves_old_images(self):
+        """Test images saved under upload names are deduplicated."""
+        storage = Post._meta.get_field('image').storage
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for i in range(3):
+            name = f'posts/image_{i}.jpg'
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as image:
+                image.write(b'image')
+            Post.objects.create(text='Тестовый текст', author=self.user,
+                                image=name)
+        Post.objects.create(text='Тестовый текст', author=self.user,
+                            image='posts/lost.jpg')
+        post = Post.objects.get(image='posts/image_0.jpg')
+        version = generations.version(f'post:{post.pk}')
+        out = io.StringIO()
+        call_command('rehash_images', stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(), 'Moved 3 images into 1 files, 1 missing.'
+        )
+        names = set(Post.objects.exclude(
+            image='posts/lost.jpg'
+        ).values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 3)
+        self.assertNotEqual(generations.version(f'post:{post.pk}'), version)
+        self.assertGreater(Post.objects.get(pk=post.pk).modified,
+                           post.modified)
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.paginator import CursorPaginator
+from posts.models import Post
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(settings.PAGE_COUNTS * 2 + 5)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-created', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def setUp(self) -> None:
+        self.client = Client()
+        cache.clear()
+
+    def get_page(self, cursor=None):
+        return CursorPaginator(
+            Post.objects.all(), settings.PAGE_COUNTS
+        ).get_page(cursor)
+
+    def test_walk_forward_and_back(self):
+        """Test next cursors cover every post once and previous
+        cursors lead back to the same pages.
+        """
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(pages[-1].next_cursor))
+        seen = [post.pk for page in pages for post in page]
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(pages[0].has_previous())
+        for earlier, later in zip(pages, pages[1:]):
+            with self.subTest(page=later.cursor):
+                previous = self.get_page(later.previous_cursor)
+                self.assertEqual(
+                    [post.pk for post in previous],
+                    [post.pk for post in earlier]
+                )
+
+    def test_last_cursor(self):
+        """Test last cursor returns the oldest posts."""
+        page = self.get_page(self.get_page().paginator.last_cursor)
+        self.assertEqual(
+            [post.pk for post in page],
+            self.expected[-settings.PAGE_COUNTS:]
+        )
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Test broken cursor falls back to the first page."""
+        for cursor in ('', 'garbage', 'bnx8', '!!!'):
+            with self.subTest(cursor=cursor):
+                page = self.get_page(cursor)
+                self.assertEqual(
+                    [post.pk for post in page],
+                    self.expected[:settings.PAGE_COUNTS]
+                )
+
+    def test_deep_page_is_single_query(self):
+        """Test every page is one range query without COUNT(*)."""
+        page = self.get_page()
+        while page.has_next():
+            with self.assertNumQueries(1):
+                page = self.get_page(page.next_cursor)
+                list(page)
+
+    def test_views_accept_cursor(self):
+        """Test feed views follow the cursor from the query string."""
+        first = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Test_User'})
+        )
+        cursor = first.context['page_obj'].next_cursor
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Test_User'}),
+            {'cursor': cursor}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.expected[settings.PAGE_COUNTS:settings.PAGE_COUNTS * 2]
+        )
+        self.assertContains(
+            response, response.context['page_obj'].previous_cursor
+        )
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.templatetags.post_cards import card_key, post_cards
+
+User = get_user_model()
+
+
+class PostCardsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            group=cls.group
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_card_is_shared_between_feeds(self):
+        """Test card rendered for one feed is reused by another."""
+        self.client.get(reverse('posts:index'))
+        cache.set(card_key(self.post), '<p>из кэша</p>')
+        response = self.client.get(
+            reverse('posts:group-list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, '<p>из кэша</p>')
+
+    def test_edited_post_gets_new_card(self):
+        """Test editing a post renders its card again."""
+        post_cards([self.post])
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Изменённый текст'}
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Изменённый текст')
+
+    def test_delete_button_stays_outside_card(self):
+        """Test only the author sees the delete button of a cached card."""
+        delete_url = reverse(
+            'posts:post_delete', kwargs={'post_id': self.post.pk}
+        )
+        profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+        self.assertContains(
+            self.authorized_client.get(profile_url), delete_url
+        )
+        self.assertNotContains(self.client.get(profile_url), delete_url)
+        index_url = reverse('posts:index')
+        self.assertNotContains(self.client.get(index_url), delete_url)
+        self.assertContains(self.authorized_client.get(index_url), delete_url)
+
+    def test_page_cards_are_one_multi_get(self):
+        """Test cards of a page are fetched from cache all at once."""
+        posts = [self.post] + [
+            Post.objects.create(text=f'Пост {i}', author=self.user)
+            for i in range(3)
+        ]
+        post_cards(posts)
+        with mock.patch(
+            'posts.templatetags.post_cards.cache', wraps=cache
+        ) as cached, self.assertNumQueries(0):
+            cards = post_cards(posts)
+        self.assertEqual(cached.get_many.call_count, 1)
+        self.assertEqual(cached.get.call_count, 0)
+        self.assertEqual([post for post, _ in cards], posts)
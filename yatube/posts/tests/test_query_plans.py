@@ -0,0 +1,81 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTest(TestCase):
+    """Every query of the post views must be an index
+    search without full scans and temp sorts.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.author = User.objects.create(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(settings.PAGE_COUNTS * 2):
+            cls.post = Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author,
+                group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text='Комментарий'
+            )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def feed_urls(self, name, **kwargs):
+        url = reverse(name, kwargs=kwargs)
+        first = self.authorized_client.get(url).context['page_obj']
+        cache.clear()
+        return (
+            url,
+            f'{url}?cursor={first.next_cursor}',
+            f'{url}?cursor={first.paginator.last_cursor}',
+        )
+
+    def test_views_use_indexes(self):
+        """Test view queries have no full scans or temp sorts."""
+        urls = [
+            *self.feed_urls('posts:index'),
+            *self.feed_urls('posts:group-list', slug=self.group.slug),
+            *self.feed_urls('posts:profile', username=self.author.username),
+            *self.feed_urls('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            for sql, plan in self.plans(url):
+                for step in plan:
+                    with self.subTest(url=url, sql=sql, step=step):
+                        self.assertNotRegex(step, FULL_SCAN)
+                        self.assertNotIn(TEMP_SORT, step)
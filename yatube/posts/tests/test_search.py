@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Group, Post
+from posts.search import SearchResults, match_query
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+        cls.other = User.objects.create(username='Other_User')
+        cls.group = Group.objects.create(title='Группа', slug='test_slug')
+        cls.post = Post.objects.create(
+            text='Путешествие по горам Алтая',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            text='Горы, горы и ещё раз горы',
+            author=cls.other
+        )
+
+    def search(self, text, **filters):
+        return list(SearchResults(text, **filters)[0:10])
+
+    def test_match_query(self):
+        """Test every word becomes a quoted prefix, punctuation is dropped."""
+        self.assertEqual(match_query('горы "Алтая"'), '"горы"* "Алтая"*')
+        self.assertIsNone(match_query(' ,. '))
+
+    def test_finds_posts_by_text_and_prefix(self):
+        """Test words and their prefixes match posts."""
+        self.assertEqual(self.search('алтая'), [self.post])
+        self.assertEqual(self.search('путеш'), [self.post])
+        self.assertEqual(self.search('ничего'), [])
+
+    def test_finds_posts_by_comments(self):
+        """Test comment text leads to its post."""
+        comment = Comment.objects.create(
+            post=self.other_post, author=self.user, text='Чудесный закат'
+        )
+        self.assertEqual(self.search('закат'), [self.other_post])
+        comment.delete()
+        self.assertEqual(self.search('закат'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test triggers keep the index in sync with posts."""
+        Post.objects.filter(pk=self.post.pk).update(text='Озеро Байкал')
+        self.assertEqual(self.search('алтая'), [])
+        self.assertEqual(self.search('байкал'), [self.post])
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertEqual(self.search('байкал'), [])
+
+    def test_filters_and_ranking(self):
+        """Test group and author filters, better matches come first."""
+        self.assertEqual(self.search('гор'), [self.other_post, self.post])
+        self.assertEqual(
+            self.search('гор', group_id=self.group.pk), [self.post]
+        )
+        self.assertEqual(
+            self.search('гор', author_id=self.other.pk), [self.other_post]
+        )
+        self.assertEqual(SearchResults('гор').count(), 2)
+
+    def test_other_databases_search_without_index(self):
+        """Test search works with LIKE where the index is missing."""
+        with mock.patch.object(search, 'indexed', return_value=False):
+            self.assertEqual(self.search('Алтая'), [self.post])
+            self.assertEqual(
+                self.search('гор', author_id=self.other.pk),
+                [self.other_post]
+            )
+            self.assertEqual(
+                list(search.matching(Post.objects.all(), 'Путеш')),
+                [self.post]
+            )
+
+    def test_unknown_filter_is_not_found(self):
+        """Test a group or author that does not exist is not ignored."""
+        for filters in ({'group': 'missing'}, {'author': 'missing'}):
+            with self.subTest(filters=filters):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': 'гор', **filters}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_search_page(self):
+        """Test search page lists matches and keeps filters in links."""
+        for index in range(12):
+            Post.objects.create(text=f'Горы номер {index}', author=self.user)
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'гор', 'author': 'Test_User'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 13)
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(
+            response, '?q=%D0%B3%D0%BE%D1%80&amp;author=Test_User&amp;page=2'
+        )
+
+    def test_admin_search_uses_index(self):
+        """Test admin changelist searches posts through the index."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'алт'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [self.post])
@@ -0,0 +1,148 @@
+import io
+import shutil
+import tempfile
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+from posts.templatetags.post_cards import post_cards
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def small_gif(name):
+    """Image with content of its own, so storage does not share it."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'GIF')
+    buffer.write(name.encode())
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Test_User')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            author=self.user,
+            image=small_gif(f'{self.id()}.gif')
+        )
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_request_shows_placeholder(self):
+        """Test page does not wait for a thumbnail that is not ready."""
+        response = self.client.get(self.url)
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertIsNone(
+            default.kvstore.get(ImageFile(self.post.image.name))
+        )
+
+    def test_generated_thumbnail_replaces_placeholder(self):
+        """Test ready thumbnails reach cached pages and cards."""
+        etag = self.client.get(self.url)['ETag']
+        self.client.get(reverse('posts:index'))
+        thumbnails.generate(self.post.image.name)
+        self.assertIsNotNone(thumbnails.ready(self.post.image.name))
+        for url in (self.url, reverse('posts:index')):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, '<img class="card-img')
+                self.assertNotContains(response, 'aspect-ratio')
+
+    def test_page_looks_thumbnails_up_at_once(self):
+        """Test cards of a page read their pictures with no query."""
+        for i in range(4):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=self.user,
+                image=small_gif(f'small{i}.gif')
+            )
+        thumbnails.generate(self.post.image.name)
+        posts = list(Post.objects.select_related('author', 'group'))
+        with self.assertNumQueries(0):
+            cards = post_cards(posts)
+        images = [card.count('<img class="card-img') for _, card in cards]
+        self.assertEqual(sorted(images), [0, 0, 0, 0, 1])
+
+    def test_broken_image_is_not_queued_again(self):
+        """Test an image sorl can not decode waits before a retry."""
+        name = self.post.image.name
+        with self.post.image.storage.open(name, 'wb') as file:
+            file.write(b'not an image')
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.generate(name)
+        with mock.patch.object(thumbnails, 'pregenerate') as pregenerate:
+            self.assertIsNone(thumbnails.ready(name))
+            pregenerate.assert_not_called()
+            cache.delete(thumbnails.failed_key(name))
+            thumbnails.ready(name)
+            pregenerate.assert_called_once_with(name)
+
+    def test_picture_has_modern_formats(self):
+        """Test post image is offered in several widths as WebP."""
+        name = self.post.image.name
+        with self.post.image.storage.open(name, 'wb') as file:
+            Image.new('RGB', (2000, 1000)).save(file, 'GIF')
+        thumbnails.generate(name)
+        response = self.client.get(self.url)
+        self.assertContains(response, '<source type="image/webp"')
+        picture = thumbnails.ready(name)
+        webp = dict(picture.sources)['image/webp']
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertIn(f'.webp {width}w', webp)
+
+    def test_small_image_is_not_upscaled(self):
+        """Test copies of a small image keep its own width once."""
+        thumbnails.generate(self.post.image.name)
+        picture = thumbnails.ready(self.post.image.name)
+        webp = dict(picture.sources)['image/webp']
+        self.assertEqual(webp.count(','), 0)
+        self.assertTrue(webp.endswith('.webp 1w'))
+
+    def test_missing_copy_is_retried_later(self):
+        """Test a picture without some copies is kept for a while."""
+        create = thumbnails.create
+
+        def failing(name, geometry, options):
+            if options.get('format') == 'WEBP':
+                raise OSError('No encoder')
+            return create(name, geometry, options)
+
+        with mock.patch.object(thumbnails, 'create', failing), \
+                mock.patch.object(cache, 'set_many') as set_many, \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.generate(self.post.image.name)
+        key = thumbnails.picture_key(self.post.image.name, 'card')
+        pictures, timeout = next(
+            call[0] for call in set_many.call_args_list if key in call[0][0]
+        )
+        self.assertEqual(timeout, settings.THUMBNAIL_RETRY_AFTER)
+        _, sources = pictures[key]
+        self.assertNotIn('image/webp', dict(sources))
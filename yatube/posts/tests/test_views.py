@@ -274,25 +274,49 @@ class TestPostPages(TestCase):
         self.assertTrue(context.image)
 
     def test_cache_index(self):
-        """Test content is delivered from cache."""
-        new_post = Post.objects.create(
-            text='delete',
-            author=self.user
-        )
+        """Test content is delivered from cache until a post changes."""
         response = self.authorized_client.get(
             reverse('posts:index')
         )
         content = response.content
-        Post.objects.filter(pk=new_post.id).delete()
-        Post.objects.create(
+        Post.objects.filter(pk=self.post.pk).update(text='delete')
+        response_cached = self.authorized_client.get(
+            reverse('posts:index')
+        )
+        self.assertEqual(content, response_cached.content)
+        new_post = Post.objects.create(
             text='delete_2',
             author=self.user
         )
+        response_new = self.authorized_client.get(
+            reverse('posts:index')
+        )
+        self.assertContains(response_new, new_post.text)
+        new_post.delete()
         response_del = self.authorized_client.get(
             reverse('posts:index')
         )
-        content_del = response_del.content
-        self.assertEqual(content, content_del)
+        self.assertNotContains(response_del, new_post.text)
+
+    def test_cached_feeds_show_new_post(self):
+        """Test cached group and follow feeds show a new post at once."""
+        pages = {
+            reverse('posts:group-list', kwargs={'slug': self.group.slug}):
+                self.user,
+            reverse('posts:follow_index'): self.user_following,
+        }
+        for page, author in pages.items():
+            with self.subTest(page=page):
+                self.authorized_client.get(page)
+                Post.objects.create(
+                    text=f'Новый пост {author.username}',
+                    author=author,
+                    group=self.group
+                )
+                response = self.authorized_client.get(page)
+                self.assertContains(
+                    response, f'Новый пост {author.username}'
+                )
 
     def test_follow(self):
         """Test following exists after request."""
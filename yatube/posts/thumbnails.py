@@ -0,0 +1,215 @@
+"""Thumbnails of post images, generated off the request path.
+
+Uploads queue every geometry of ``POST_THUMBNAILS`` on a thread pool
+once the transaction commits. When all of them are made the worker
+stores a picture of the image in the cache: the URL and size of the
+fallback and the ``srcset`` of every format. Templates only read
+pictures, all images of a page with one cache multi-get, and show a
+placeholder until they are there, so a request never waits for Pillow
+or the storage. An image sorl can not decode is not queued again for
+``THUMBNAIL_RETRY_AFTER`` seconds.
+
+Besides the fallback of each size, images get copies in the widths of
+``POST_IMAGE_WIDTHS`` for every format of ``POST_IMAGE_FORMATS`` that
+both Pillow and sorl can write, served through ``<picture>``.
+"""
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.dispatch import Signal
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+
+logger = logging.getLogger(__name__)
+
+thumbnails_ready = Signal(providing_args=['name'])
+
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+PICTURE_KEY = 'thumbnails:picture:{}:{}'
+FAILED_KEY = 'thumbnails:failed:{}'
+
+Picture = namedtuple('Picture', ['image', 'sources'])
+
+_executor = None
+_queued = set()
+_lock = threading.Lock()
+
+
+def digest(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def picture_key(name: str, size: str) -> str:
+    """Key of the picture, changing with the settings of the size."""
+    config = repr((settings.POST_THUMBNAILS[size], variants(size)))
+    return PICTURE_KEY.format(size, digest(f'{config}|{name}'))
+
+
+def failed_key(name: str) -> str:
+    return FAILED_KEY.format(digest(name))
+
+
+def formats() -> list:
+    """Modern formats of the variants that Pillow and sorl can write."""
+    Image.init()
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ in Image.SAVE and format_ in EXTENSIONS
+    ]
+
+
+def variants(size: str = 'card') -> list:
+    """Format, width, geometry and options of the copies of a size.
+    Copies are never upscaled: a small image gets fewer widths.
+    """
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = map(int, geometry.split('x'))
+    return [
+        (
+            format_, variant_width,
+            f'{variant_width}x{round(variant_width * height / width)}',
+            {**options, 'format': format_, 'upscale': False}
+        )
+        for format_ in formats()
+        for variant_width in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+def ready(name: str, size: str = 'card'):
+    """Picture of the image or None, queueing missing thumbnails."""
+    return prefetch([name], size)[name]
+
+
+def prefetch(names, size: str = 'card') -> dict:
+    """Pictures of many images by name, None for the images whose
+    thumbnails are not made yet. Those are queued, unless they failed
+    recently.
+    """
+    keys = {picture_key(name, size): name for name in set(names)}
+    found = cache.get_many([*keys, *map(failed_key, keys.values())])
+    pictures = {}
+    for key, name in keys.items():
+        picture = found.get(key)
+        if picture is None:
+            if failed_key(name) not in found:
+                pregenerate(name)
+            pictures[name] = None
+            continue
+        image, sources = picture
+        pictures[name] = Picture(deserialize_image_file(image), sources)
+    return pictures
+
+
+def create(name: str, geometry: str, options: dict) -> ImageFile:
+    """Thumbnail made by sorl. sorl logs a source it can not decode
+    and returns a file it never wrote, which is turned into an error.
+    """
+    thumbnail = get_thumbnail(name, geometry, **options)
+    if default.kvstore.get(thumbnail) is None:
+        raise OSError(f'No {geometry} thumbnail of {name}')
+    return thumbnail
+
+
+def generate(name: str) -> None:
+    """Create every configured thumbnail of the image and store its
+    pictures, or remember that it failed. A picture missing some copies
+    is kept for ``THUMBNAIL_RETRY_AFTER`` seconds only, so they are
+    tried again later rather than on every render.
+    """
+    try:
+        complete = True
+        pictures = {}
+        for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+            image = create(name, geometry, options)
+            sources = {}
+            for format_, _, *variant in variants(size):
+                try:
+                    thumbnail = create(name, *variant)
+                except Exception:
+                    logger.exception(
+                        '%s %s thumbnail of %s failed',
+                        format_, variant[0], name
+                    )
+                    complete = False
+                    continue
+                srcset = sources.setdefault(format_, {})
+                srcset.setdefault(
+                    thumbnail.width, f'{thumbnail.url} {thumbnail.width}w'
+                )
+            pictures[picture_key(name, size)] = (
+                serialize_image_file(image),
+                [(MIME_TYPES[format_], ', '.join(srcset.values()))
+                 for format_, srcset in sources.items()]
+            )
+        cache.set_many(
+            pictures, None if complete else settings.THUMBNAIL_RETRY_AFTER
+        )
+        thumbnails_ready.send(sender=generate, name=name)
+    except Exception:
+        logger.exception('Thumbnails of %s failed', name)
+        cache.set(failed_key(name), True, settings.THUMBNAIL_RETRY_AFTER)
+    finally:
+        with _lock:
+            _queued.discard(name)
+        if threaded():
+            connections.close_all()
+
+
+def drop(name: str) -> None:
+    """Delete thumbnails of an image, their store entries and its
+    pictures.
+    """
+    default.kvstore.delete(ImageFile(name))
+    cache.delete_many([
+        picture_key(name, size) for size in settings.POST_THUMBNAILS
+    ])
+
+
+def forget(name: str) -> None:
+    """Delete thumbnails of a deleted image and their store entries
+    after commit.
+    """
+    transaction.on_commit(lambda: drop(name))
+
+
+def pregenerate(name: str) -> None:
+    """Queue thumbnails of the image once the current transaction
+    commits, so the worker sees the committed post.
+    """
+    if name:
+        transaction.on_commit(lambda: submit(name))
+
+
+def threaded() -> bool:
+    """Whether jobs go to the pool. An in-memory SQLite database
+    (tests) can not be shared with other threads' connections.
+    """
+    return bool(settings.THUMBNAIL_WORKERS) and not (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    )
+
+
+def submit(name: str) -> None:
+    """Hand the image to the pool unless it is already queued."""
+    global _executor
+    with _lock:
+        if name in _queued:
+            return
+        _queued.add(name)
+        if _executor is None and threaded():
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+            )
+    if threaded():
+        _executor.submit(generate, name)
+    else:
+        generate(name)
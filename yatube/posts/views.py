@@ -1,68 +1,108 @@
+from urllib.parse import urlencode
+
+from core import generations
+from core.paginator import CursorPaginator
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import (
     get_object_or_404,
     redirect,
     render)
-from django.views.decorators.cache import cache_page
 
+from . import feeds, search
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Follow, Group, Post, User
+
+
+def group_scopes(request: HttpRequest, slug: str) -> list:
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('pk', flat=True).first()
+    if group_id is not None:
+        return [f'group:{group_id}']
+
+
+def profile_scopes(request: HttpRequest, username: str) -> list:
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if author_id is not None:
+        return [f'author:{author_id}', f'counters:{author_id}']
+
 
+def post_scopes(request: HttpRequest, post_id: int) -> list:
+    """Scopes of the post, its author's counters and its group."""
+    found = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', 'group_id').first()
+    if found is not None:
+        author_id, group_id = found
+        scopes = [f'post:{post_id}', f'author:{author_id}']
+        if group_id is not None:
+            scopes.append(f'group:{group_id}')
+        return scopes
 
-@cache_page(20)
+
+@generations.conditional(lambda request: ['global'])
+@generations.cache_page(settings.FEED_CACHE_TIMEOUT, 'global')
 def index(request: HttpRequest) -> HttpResponse:
     """View-Function returns rendered html-view
     with ten(10) last posts.
     """
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PAGE_COUNTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    paginator = CursorPaginator(post_list, settings.PAGE_COUNTS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     title = 'Последние обновления на сайте'
     description = 'Последние обновления на сайте'
     context = {
         'page_obj': page_obj,
         'title': title,
-        'description': description
+        'description': description,
+        'feed_version': generations.version('global'),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, 'posts/index.html', context)
 
 
+@generations.conditional(group_scopes)
 def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
     """View-Function returns rendered html-view
     with posts which do belong to a certain group.
     """
     group = get_object_or_404(Group, slug=slug)
     title = f'Записи сообщества {group.title.capitalize()}'
-    posts = Post.objects.filter(group=group).all()
-    paginator = Paginator(posts, settings.PAGE_COUNTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.filter(group=group).select_related('author')
+    paginator = CursorPaginator(posts, settings.PAGE_COUNTS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     template = 'posts/group_list.html'
     description = 'Записи сообщества '
     context = {
         'title': title,
         'group': group,
         'page_obj': page_obj,
-        'description': description
+        'description': description,
+        'feed_version': generations.version(f'group:{group.pk}'),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, template, context)
 
 
+@generations.conditional(profile_scopes)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
     """View-Function returns rendered
     html-view with a profile info.
     """
     user = request.user
-    profile_info = get_object_or_404(User, username=username)
+    profile_info = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
     title = f'Профайл пользователя {profile_info.get_full_name()}'
-    posts = profile_info.posts.all()
-    paginator = Paginator(posts, settings.PAGE_COUNTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = profile_info.posts.select_related('author', 'group')
+    paginator = CursorPaginator(posts, settings.PAGE_COUNTS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     template = 'posts/profile.html'
     following = True
     if user.is_authenticated:
@@ -73,18 +113,25 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
         'title': title,
         'page_obj': page_obj,
         'following': following,
-        'user': user
+        'user': user,
+        'is_owner': user == profile_info,
+        'feed_version': generations.version(f'author:{profile_info.pk}'),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, template, context)
 
 
+@generations.conditional(post_scopes)
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     """View-Function returns rendered
     html-view with a post details.
     """
     form = CommentForm()
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.filter(post=post).all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        pk=post_id
+    )
+    comments = post.comments.select_related('author')
     if len(post.text) > 20:
         title = post.text[:20] + '...'
     else:
@@ -98,6 +145,42 @@ def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_search(request: HttpRequest) -> HttpResponse:
+    """View-Function returns rendered html-view
+    with ranked posts matching the search query.
+    """
+    text = request.GET.get('q', '').strip()
+    slug = request.GET.get('group')
+    group = get_object_or_404(Group, slug=slug) if slug else None
+    username = request.GET.get('author')
+    author = get_object_or_404(User, username=username) if username else None
+    results = search.SearchResults(
+        text,
+        group_id=group and group.pk,
+        author_id=author and author.pk
+    )
+    paginator = Paginator(results, settings.PAGE_COUNTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    filters = {
+        'q': text,
+        'group': group and group.slug,
+        'author': author and author.username
+    }
+    context = {
+        'title': f'Поиск: {text}' if text else 'Поиск',
+        'query': text,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.order_by('title'),
+        'page_obj': page_obj,
+        'filters': urlencode(
+            {key: value for key, value in filters.items() if value}
+        )
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@transaction.atomic
 def post_create(request: HttpRequest) -> HttpResponse:
     """View-Function returns rendered
     html-view with a form to create a post.
@@ -134,17 +217,20 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
         return render(request,
                       'posts/update_post.html',
                       {'form': form, 'post': post})
-    form = PostForm(request.POST)
+    form = PostForm(request.POST, files=request.FILES or None)
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post.text = form.cleaned_data['text']
     post.group = form.cleaned_data['group']
+    if form.cleaned_data['image']:
+        post.image = form.cleaned_data['image']
     post.author = request.user
     post.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request: HttpRequest, post_id: int) -> HttpResponse:
     """View-function that creates comments
      and redirects to post details' page.
@@ -164,34 +250,31 @@ def add_comment(request: HttpRequest, post_id: int) -> HttpResponse:
 @login_required
 def follow_index(request: HttpRequest) -> HttpResponse:
     """View-function returns view with posts list of following authors."""
-    followings = request.user.follower.all()
-    lst_of_followings = []
-    for following in followings:
-        lst_of_followings.append(following.author)
-    posts = Post.objects.filter(author__in=lst_of_followings)
-    paginator = Paginator(posts, settings.PAGE_COUNTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = feeds.follow_page(request.user, request.GET.get('cursor'))
     title = 'Подписки'
     description = 'Все посты пользователей, на которых вы подписаны'
     context = {
         'page_obj': page_obj,
         'title': title,
-        'description': description
+        'description': description,
+        'feed_version': generations.version(
+            f'follows:{request.user.pk}',
+            *(f'author:{pk}' for pk in Follow.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True))
+        ),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request: HttpRequest, username: str) -> HttpResponse:
     """View-function to follow author."""
     author = User.objects.get(username=username)
-    following = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if author != request.user and not following:
-        Follow.objects.create(
+    if author != request.user:
+        Follow.objects.get_or_create(
             user=request.user,
             author=author
         )
@@ -199,6 +282,7 @@ def profile_follow(request: HttpRequest, username: str) -> HttpResponse:
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request: HttpRequest, username: str) -> HttpResponse:
     """View-function to unfollow author."""
     author = User.objects.get(username=username)
@@ -213,6 +297,7 @@ def profile_unfollow(request: HttpRequest, username: str) -> HttpResponse:
 
 
 @login_required
+@transaction.atomic
 def delete_post(request: HttpRequest, post_id: int) -> HttpResponse:
     """View-function that deletes post."""
     post = Post.objects.get(pk=post_id)
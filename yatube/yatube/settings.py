@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -53,6 +54,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.TemplateProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +75,9 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
+        # Without DEBUG Django wraps these loaders in the cached one and
+        # templates compile once per process (see core.warmup); with it
+        # edited templates are picked up without a restart
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -151,17 +159,116 @@ ADMINS = [
 
 PAGE_COUNTS = 10
 
+# 'timeline' (fan-out on write), 'merge' (k-way merge on read) or 'query'
+FOLLOW_FEED_ENGINE = 'timeline'
+
+FEED_RECENT_POSTS = 200
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Most posts the API returns for one list of ids
+API_BATCH_LIMIT = 300
+
+QUERY_INSPECTOR_SAMPLE_RATE = 0.01
+QUERY_INSPECTOR_BUDGET = 30
+QUERY_INSPECTOR_REPEATS = 5
+QUERY_INSPECTOR_RAISE = False
+
+# Request metrics: the file shared by processes, how often a process
+# adds its values to it and the bounds of the latency histogram
+METRICS_ENABLED = True
+METRICS_DATABASE = os.path.join(BASE_DIR, 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Bearer token of the scraper; without it only staff see /metrics/
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Slow queries (seconds, None to disable) are logged with their view
+# and template line; SQL gets a comment naming them
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_COMMENTS = True
+
+# Timing of templates, tags and filters: a table per request and
+# percentiles every TEMPLATE_PROFILER_REPORT_EVERY requests
+TEMPLATE_PROFILER = False
+TEMPLATE_PROFILER_REPORT_EVERY = 100
+TEMPLATE_PROFILER_SAMPLES = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {'format': '%(asctime)s %(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'core.handlers.BackgroundRotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'slow_queries.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'timestamped',
+        },
+        'template_profiler': {
+            'class': 'core.handlers.BackgroundRotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'templates.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'timestamped',
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.template_profiler': {
+            'handlers': ['template_profiler'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Post image uploads: file size, longest side after downscaling,
+# pixel limit of formats without draft and JPEG quality
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_MAX_DECODE_PIXELS = 24 * 1000 * 1000
+POST_IMAGE_QUALITY = 85
+
+# Post image thumbnails: size -> (geometry, sorl options)
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Widths and modern formats of the srcset copies, AVIF when Pillow
+# and sorl support it
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP')
+# Thumbnail worker threads; 0 makes them right after the commit
+THUMBNAIL_WORKERS = 2
+# Seconds before an image whose thumbnails failed is tried again
+THUMBNAIL_RETRY_AFTER = 60 * 60
+
+# Cache in an SQLite file shared by all processes
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
-]
\ No newline at end of file
+]
+
+# Keeps the cache and metrics of test runs apart from the site's files
+TEST_RUNNER = 'core.testing.TestRunner'
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# After setup(): templates, URLs and heavy imports are ready before fork
+from core.warmup import warmup  # noqa: E402
+
+warmup()